@@ -1,12 +1,29 @@
-from copy import deepcopy
-from dataclasses import dataclass, astuple
+from copy import copy, deepcopy
+import collections
+import contextlib
+import concurrent.futures
+from dataclasses import dataclass, astuple, replace
 import typing
+import itertools
+import os
+import hashlib
+import json
+import importlib.metadata
+import pickle
 import pathlib
+import sys
+import time
+import tracemalloc
 import numpy as np
 import warnings
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
 
 C0 = 2.99792458e8  # Speed of light
 MU0 = 4*np.pi*1e-7  # H/m aka vacuum magnetic permeability
+C0_NEC = 1/np.sqrt(MU0*8.854e-12)  # Speed of light in NEC2 (from its eps0)
 ETA0 = MU0 * C0  # Impedance of free space
 
 PRGINPS = {'STGEOM', 'PCNTRL'}
@@ -104,17 +121,53 @@ class Deck:
     
     @classmethod
     def load_necfile_cls(cls, file, cardformat='COLUMNS'):
-        deck =  cls()
-        for cardstr in file.readlines():
-            cardargs = cls._cardstr2args(cardstr, cardformat)
-            deck.append_card(*cardargs)
+        return cls().load_necfile(file, cardformat)
 
     def load_necfile(self, file, cardformat='COLUMNS'):
+        """\
+        Load the cards of a NEC file, replacing those of this deck
+
+        The file is read in one go and each line parsed with the precompiled
+        parser of its card, see _CARD_PARSERS.
+
+        Parameters
+        ----------
+        file : file
+            Open NEC file.
+        cardformat : str
+            'COLUMNS' for fixed column cards, else whitespace separated.
+        """
         self.__init__()
-        for cardstr in file.readlines():
-            cardargs = self.__class__._cardstr2args(cardstr, cardformat)
-            self.append_card(*cardargs)
+        cardstrs = file.read().split('\n')
+        if cardstrs[-1] == '':
+            cardstrs.pop()
+        _cardstr2args = self.__class__._cardstr2args
+        self.carddeck = [_cardstr2args(_cs, cardformat) for _cs in cardstrs]
         return self
+
+    def gw_arrays(self):
+        """\
+        Get the parameters of the deck's GW cards as arrays
+
+        Parameters that are missing from a card are 0.
+
+        Returns
+        -------
+        tags : array
+            Tag nrs of the wires, shape (nwires,).
+        nsegs : array
+            Nr of segments of the wires, shape (nwires,).
+        ends : array
+            End points of the wires, shape (nwires, 2, 3).
+        radii : array
+            Radii of the wires, shape (nwires,).
+        """
+        gws = [_c[1:] for _c in self.carddeck if _c[0] == 'GW']
+        if any(len(_gw) != 9 for _gw in gws):
+            gws = [tuple(_gw) + (0,)*(9-len(_gw)) for _gw in gws]
+        gws = np.array(gws, float).reshape((-1, 9))
+        return (gws[:, 0].astype(int), gws[:, 1].astype(int),
+                gws[:, 2:8].reshape((-1, 2, 3)), gws[:, 8])
     
     def save_necfile(self, file):
         necfile_suffix = '.nec'
@@ -128,8 +181,28 @@ class Deck:
             f = open(file, 'w')
         else:
             f = file
-        f.write(str(self))
+        self.write_to(f)
         f.close()
+
+    def write_to(self, fileobj):
+        """\
+        Write the deck to an open file, card by card
+
+        Gives the same text as str(deck) but streams it, so the text of the
+        whole deck is never held in memory.
+        """
+        fileobj.writelines(self._iter_cardstrs())
+
+    def _iter_cardstrs(self):
+        # Lines of the deck, with newlines, formatted with _CARD_FORMATTERS
+        for card in self.carddeck:
+            mn_id = card[0]
+            fmt, ntypes = _CARD_FORMATTERS[mn_id]
+            if fmt is None:
+                yield mn_id + card[1] + '\n'
+            else:
+                yield fmt.format(*[ntype(_p) for ntype, _p
+                                   in zip(ntypes, card[1:])])
     
     def as_pynec(self):
         pynec_code_list = []
@@ -188,73 +261,120 @@ class Deck:
 
         return pynec_code_strs
     
-    def exec_pynec(self, printout=False):
-        _locals = {}
-        _code = self.as_pynec()
-        _nrblcks = len(_code)
-        _blcknr = 0
-        for _blck in _code:
-            _blcknr += 1
+    def _pynec_blocks(self):
+        """\
+        Split deck into execution blocks, ie card lists ending with RP or XQ
+
+        Comment cards and cards after the last execution card are dropped,
+        unless there are no execution cards at all, in which case the deck
+        is one block.
+        """
+        blcks = []
+        _blck = []
+        for card in self.carddeck:
+            if card[0] in CARDS_COMMT: continue
+            _blck.append(card)
+            if card[0] in {'RP', 'XQ'}:
+                blcks.append(_blck)
+                _blck = []
+        if len(blcks) == 0:
+            blcks.append(_blck)
+        return blcks
+
+    def exec_pynec(self, printout=False, stats=None):
+        """\
+        Execute deck with PyNEC
+
+        Cards are passed to PyNEC by calling its methods directly (see
+        PYNEC_CALLS), with the one nec_context for the whole deck. The time
+        spent on geometry and control cards is recorded in RunStats `stats`,
+        if given, as phases 'geometry' and 'solve'.
+
+        Yields
+        ------
+        nec_context : PyNEC.nec_context
+            The context after each execution block has run.
+        """
+        import PyNEC
+        _nec_context = PyNEC.nec_context()
+        _blcks = self._pynec_blocks()
+        _nrblcks = len(_blcks)
+        for _blcknr, _blck in enumerate(_blcks, start=1):
             if printout:
                 print(f'**** Executing code block {_blcknr}/{_nrblcks}:')
-                print(_blck)
-            exec(_blck, None, _locals)
+                print(Deck(_blck), end='')
+            _geom = [_c for _c in _blck if _c[0] in CARDS_GEOMT]
+            _cntrl = [_c for _c in _blck if _c[0] not in CARDS_GEOMT]
+            for _phase_name, _cards in (('geometry', _geom),
+                                        ('solve', _cntrl)):
+                if not _cards: continue
+                with _phase(stats, _phase_name):
+                    for card in _cards:
+                        pynec_call = PYNEC_CALLS.get(card[0])
+                        if pynec_call:
+                            pynec_call(_nec_context, *card[1:])
             if printout:
                 print('**** Finished code block.')
-            _nec_context_ = _locals['_nec_context']
-            yield _nec_context_
-        exec('del _nec_context', None, _locals)
+            yield _nec_context
 
     @classmethod
     def _cardstr2args(cls, cardstr, cardformat='COLUMNS'):
-
-        def split_cols(l, pnames, lbls):
-            cardparms = []
-            for lbl in lbls:
-                nrcols, ntype = cls._parmcolwidth(lbl)
-                colstr = l[:nrcols]
-                parmtoadd = None
-                if lbl in pnames and colstr:
-                    try:
-                        parmtoadd = ntype(colstr)
-                    except ValueError:
-                        raise ValueError(
-                                f'Card {mn_id}, param {lbl} is corrupt')
-                if parmtoadd is not None:
-                    cardparms.append(parmtoadd)
-                l = l[nrcols:]
-            return tuple(cardparms)
-        
-        def split_csv(l, pnames, lbls):
-            cardparms = []
-            pnames = list(pnames)
-            _parms = l.split()
-            lbl2parm = dict(zip(lbls, _parms))
-            for lbl in lbl2parm:
-                if lbl in pnames:
-                    _, ntype = cls._parmcolwidth(lbl)
-                    cardparms.append(ntype(lbl2parm[lbl]))
-            return tuple(cardparms)
-        
         l = cardstr.rstrip()
-        card = []
         mn_id = l[:2]
-        l = l[2:]
-        if mn_id not in CARDDEFS.keys():
+        try:
+            cols, csv_idxs = _CARD_PARSERS[mn_id]
+        except KeyError:
             raise ValueError(f"Memnonic id {mn_id} not valid")
-        card.append(mn_id)
-        if mn_id == 'CM' or mn_id == 'CE':
-            card.append(l)
-            return tuple(card)
-        lbls = PARLBLS[CARDDEFS[mn_id]['PRGINP']]
-        pnames = list(filter(lambda _pn : _pn in lbls, CARDDEFS[mn_id]))
+        if cols is None:
+            return (mn_id, l[2:])
         if cardformat == 'COLUMNS':
-            card = (mn_id, *split_cols(l, pnames, lbls))
-        else:
-            card = (mn_id, *split_csv(l, pnames, lbls))
-        return card
+            try:
+                return (mn_id, *[ntype(l[start:stop])
+                                 for start, stop, ntype, _ in cols
+                                 if l[start:stop]])
+            except ValueError:
+                for start, stop, ntype, lbl in cols:
+                    try:
+                        ntype(l[start:stop]) if l[start:stop] else None
+                    except ValueError:
+                        raise ValueError(
+                            f'Card {mn_id}, param {lbl} is corrupt')
+                raise
+        _parms = l[2:].split()
+        return (mn_id, *[ntype(_parms[idx]) for idx, ntype in csv_idxs
+                         if idx < len(_parms)])
+
+    @classmethod
+    def _compile_card_parser(cls, mn_id):
+        """\
+        Precompute how to parse the parameters of cards with id `mn_id`
+
+        Returns
+        -------
+        cols : list
+            (start, stop, ntype, lbl) of the card's parameters in the fixed
+            column format, with columns counted from the start of the line.
+            `None` for comment cards.
+        csv_idxs : list
+            (index, ntype) of the card's parameters among the whitespace
+            separated fields after the mnemonic id.
+        """
+        if CARDDEFS[mn_id]['PRGINP'] == 'COMMNT':
+            return None, None
+        lbls = PARLBLS[CARDDEFS[mn_id]['PRGINP']]
+        cols = []
+        csv_idxs = []
+        start = 2
+        for idx, lbl in enumerate(lbls):
+            nrcols, ntype = cls._parmcolwidth(lbl)
+            if lbl in CARDDEFS[mn_id]:
+                cols.append((start, start+nrcols, ntype, lbl))
+                csv_idxs.append((idx, ntype))
+            start += nrcols
+        return cols, csv_idxs
     
-    def _split_digits(self, int_int, nrdigits):
+    @staticmethod
+    def _split_digits(int_int, nrdigits):
         int_str = f"{int_int :0{nrdigits}d}"
         intcharlist = [*int_str]
         int_list = [int(d) for d in intcharlist]
@@ -285,37 +405,78 @@ class Deck:
         if not isinstance(other, self.__class__): return True
         return self.carddeck == other.carddeck
 
+    @classmethod
+    def _compile_card_formatter(cls, mn_id):
+        """\
+        Precompute how to format cards with id `mn_id`
+
+        Returns
+        -------
+        fmt : str
+            Format string, for str.format(), of the card's line including
+            its newline, with a field for each of the card's parameters and
+            zeros for the unused columns. `None` for comment cards.
+        ntypes : list
+            Number type of each parameter.
+        """
+        if CARDDEFS[mn_id]['PRGINP'] == 'COMMNT':
+            return None, None
+        fmt = mn_id
+        ntypes = []
+        for lbl in PARLBLS[CARDDEFS[mn_id]['PRGINP']]:
+            nrcols, ntype = cls._parmcolwidth(lbl)
+            nfmt = 'd' if ntype is int else 'g'
+            if lbl in CARDDEFS[mn_id]:
+                fmt += f"{{:>{nrcols}{nfmt}}}"
+                ntypes.append(ntype)
+            else:
+                fmt += f"{ntype(0):>{nrcols}{nfmt}}"
+        return fmt + '\n', ntypes
+
     def __str__(self):
-        lines = []
-        #lines += [f'CM *** Created using {__name__}.{__class__.__name__} ***']
-        for card in self.carddeck:
-            card = list(card)
-            mn_id = card.pop(0)
-            if mn_id == 'CM' or mn_id == 'CE':
-                line = mn_id + card.pop(0)
-                lines.append(line)
-                continue
-            lbls = PARLBLS[CARDDEFS[mn_id]['PRGINP']]
-            pnames = list(filter(lambda _pn : _pn in lbls, CARDDEFS[mn_id]))
-            line = mn_id  # Initialize output line
-            for lbl in lbls:
-                nrcols, ntype = __class__._parmcolwidth(lbl)
-                nfmt = 'd' if ntype is int else 'g'
-                if lbl in pnames:
-                    parm = ntype(card.pop(0))
-                else:
-                    parm = ntype(0)
-                parmstr = f"{parm:>{nrcols}{nfmt}}"
-                line += parmstr
-            lines.append(line)
-        _str = '\n'.join(lines) + '\n'
-        return _str
+        return ''.join(self._iter_cardstrs())
     
     def __repr__(self) -> str:
         repr_ = self.__class__.__name__+'('+ repr(self.carddeck)+")"
         return repr_
 
 
+# Precompiled parsers of the cards, see Deck._compile_card_parser()
+_CARD_PARSERS = {_mn_id: Deck._compile_card_parser(_mn_id)
+                 for _mn_id in CARDDEFS}
+# and formatters, see Deck._compile_card_formatter()
+_CARD_FORMATTERS = {_mn_id: Deck._compile_card_formatter(_mn_id)
+                    for _mn_id in CARDDEFS}
+
+
+def _pynec_ex(nec_context, *parms):
+    itmp3, itmp4 = Deck._split_digits(parms[3], 2)
+    nec_context.ex_card(*parms[:3], itmp3, itmp4, *parms[4:])
+
+
+def _pynec_rp(nec_context, *parms):
+    X, N, D, A = Deck._split_digits(parms[3], 4)
+    nec_context.rp_card(*parms[:3], X, N, D, A, *parms[4:])
+
+
+# Map of card mnemonic ids to calls of PyNEC with the card's parameters.
+# Cards not in here are ignored when executing a Deck with PyNEC.
+PYNEC_CALLS = {
+    'GW': lambda nc, *parms: nc.get_geometry().wire(*parms, 1.0, 1.0),
+    'GM': lambda nc, itgi, nrpt, rox, roy, roz, xs, ys, zs, its:
+              nc.get_geometry().move(rox, roy, roz, xs, ys, zs, its, nrpt,
+                                     itgi),
+    'GE': lambda nc, *parms: nc.geometry_complete(*parms),
+    'EK': lambda nc, *parms: nc.set_extended_thin_wire_kernel(True),
+    'EX': _pynec_ex,
+    'FR': lambda nc, *parms: nc.fr_card(*parms),
+    'GN': lambda nc, *parms: nc.gn_card(*parms[:2], *parms[4:]),  # Cols I3,
+                                                    # I4 not used by PyNEC
+    'RP': _pynec_rp,
+    'XQ': lambda nc, *parms: nc.xq_card(0),
+}
+
+
 @dataclass
 class VoltageSource:
     value: complex = 1+0j
@@ -393,6 +554,32 @@ class FreqSteps:
                      else self.start*self.incr**(self.nrsteps-1))
         return _max_freq
     
+    def split(self, nrchunks):
+        """\
+        Split into consecutive FreqSteps of (almost) equal nr of steps
+
+        Parameters
+        ----------
+        nrchunks : int
+            Number of chunks to split into. There will be fewer if there are
+            fewer steps than chunks.
+
+        Returns
+        -------
+        chunks : list
+            FreqSteps that together cover the same frequencies as this one.
+        """
+        nrchunks = max(min(nrchunks, self.nrsteps), 1)
+        chunks = []
+        stepnr = 0
+        for chunknr in range(nrchunks):
+            nrsteps = (self.nrsteps*(chunknr+1))//nrchunks - stepnr
+            start = (self.start+self.incr*stepnr if self.steptype == 'lin'
+                     else self.start*self.incr**stepnr)
+            chunks.append(FreqSteps(self.steptype, nrsteps, start, self.incr))
+            stepnr += nrsteps
+        return chunks
+
     def to_nec_type(self):
         if self.steptype == 'lin':
             return 0
@@ -470,7 +657,9 @@ class Ground:
 
 @dataclass
 class ExecutionBlock:
-    freqsteps: FreqSteps = FreqSteps()  # Should at least have this
+    freqsteps: FreqSteps = FreqSteps()  # Should at least have this, or None
+                                        # to continue the previous block's
+                                        # frequency and environment
     exciteports: typing.List = None
     radpat: RadPatternSpec = None
     ext_thinwire: bool = False
@@ -491,23 +680,114 @@ class NECout:
     inp_I: complex = None
     inp_Z: complex = None
 
+    @classmethod
+    def concat_freqs(cls, necouts):
+        """\
+        Concatenate NECouts, with the same directions, along frequency
+        """
+        necout0 = necouts[0]
+        freqs = [_f for _no in necouts for _f in _no.freqs]
+        f_tht = np.concatenate([_no.f_tht for _no in necouts])
+        f_phi = np.concatenate([_no.f_phi for _no in necouts])
+        inp_V = np.concatenate([_no.inp_V for _no in necouts])
+        inp_I = np.concatenate([_no.inp_I for _no in necouts])
+        inp_Z = np.concatenate([_no.inp_Z for _no in necouts])
+        return cls(freqs, necout0.thetas, necout0.phis, f_tht, f_phi,
+                   necout0.f_type, inp_V, inp_I, inp_Z)
+
+    @classmethod
+    def alloc_freqs(cls, necout_f, freqs):
+        """\
+        NECout for `freqs` with arrays allocated as for one frequency result
+
+        The arrays are shaped like those of the single frequency NECout
+        `necout_f`, but for all `freqs`, and are filled with set_freq().
+        """
+        def _alloc(arr):
+            arr = np.asarray(arr)
+            if arr.size == 0:
+                return arr
+            return np.empty((len(freqs),) + arr.shape[1:], arr.dtype)
+        return cls(freqs, necout_f.thetas, necout_f.phis,
+                   _alloc(necout_f.f_tht), _alloc(necout_f.f_phi),
+                   necout_f.f_type, _alloc(necout_f.inp_V),
+                   _alloc(necout_f.inp_I), _alloc(necout_f.inp_Z))
+
+    def set_freq(self, frqnr, necout_f):
+        """\
+        Set results of frequency number `frqnr` from single frequency NECout
+        """
+        for _attr in ('f_tht', 'f_phi', 'inp_V', 'inp_I', 'inp_Z'):
+            arr = getattr(self, _attr)
+            if np.size(arr) != 0:
+                arr[frqnr] = getattr(necout_f, _attr)[0]
+
 
 class StructureCurrents:
-    def __init__(self, freqs, nr_ants):
+    """\
+    Currents on the segments of a structure
+
+    Parameters
+    ----------
+    freqs : list
+        Frequencies in MHz.
+    nr_ants : int
+        Number of antennas.
+    capture_dtype : dtype
+        If not `None`, the currents set for each excitation and frequency are
+        kept, when capture() is called, in the array `currents_arr` of this
+        dtype (e.g. complex or np.complex64). The array has shape
+        (nr_excitations, nr_freqs, nr_segments) and is allocated once.
+    nr_excitations : int
+        Number of excitations to capture. Default is `nr_ants`.
+    """
+    def __init__(self, freqs, nr_ants, capture_dtype=None,
+                 nr_excitations=None):
         self.freqs = freqs
         self.impedance = np.zeros((nr_ants, nr_ants))
         self.currents = []
         self._segtags = []
         self._segnums = []
+        self._indices = {}  # Cache of current indices for (tags, seg)
+        self.capture_dtype = capture_dtype
+        self.nr_excitations = (nr_ants if nr_excitations is None
+                               else nr_excitations)
+        self.currents_arr = None
 
     def set_currents(self, currents):
         self.currents = currents
 
+    def capture(self, excitnr, frqnr=slice(None), currents=None):
+        """\
+        Store currents of excitation `excitnr` & frequency `frqnr`
+
+        Stores `currents`, or the last set currents if `None`, in
+        `currents_arr`. Does nothing if capture_dtype is `None`.
+        """
+        if self.capture_dtype is None:
+            return
+        if currents is None:
+            currents = self.currents
+        if self.currents_arr is None:
+            self.currents_arr = np.zeros((self.nr_excitations,
+                                          len(self.freqs),
+                                          np.shape(currents)[-1]),
+                                         self.capture_dtype)
+        self.currents_arr[excitnr, frqnr] = currents
+
+    def get_segtags(self):
+        return np.asarray(self._segtags)
+
+    def get_segnums(self):
+        return np.asarray(self._segnums)
+
     def set_segtags(self, segtags):
         self._segtags = segtags
+        self._indices = {}
 
     def set_segnums(self, segnums):
         self._segnums = segnums
+        self._indices = {}
 
     def _current_index(self, tag, seg):
         # Get the absolute segment nums with excited tag
@@ -519,6 +799,571 @@ class StructureCurrents:
     def get_current(self, tag, seg):
         return self.currents[self._current_index(tag, seg)]
 
+    def _current_indices(self, tags, seg):
+        # Like _current_index() but for many tags. The indices only depend
+        # on the segment tags & numbers, so they are computed once.
+        key = (tuple(tags), seg)
+        if key not in self._indices:
+            uniqtags, firstidxs = np.unique(self._segtags, return_index=True)
+            tagidxs = np.searchsorted(uniqtags, tags).clip(
+                0, len(uniqtags)-1)
+            missing = np.asarray(tags)[uniqtags[tagidxs] != tags]
+            if missing.size:
+                raise ValueError(f'Tags {missing.tolist()} not in structure')
+            abstagsegs = np.asarray(self._segnums)[firstidxs[tagidxs]]
+            self._indices[key] = abstagsegs+seg-2
+        return self._indices[key]
+
+    def get_currents(self, tags, seg):
+        """Get the currents on segment `seg` of each tag in `tags`"""
+        return np.asarray(self.currents)[self._current_indices(tags, seg)]
+
+
+class NECcache:
+    """\
+    On-disk cache of NEC run results
+
+    Results are stored as pickle files in a cache directory and are keyed by
+    a hash of the canonical text of the Deck that produced them, the kind of
+    result and the PyNEC version. When the total size of the cache exceeds
+    `maxsize` bytes the least recently used results are evicted.
+
+    Parameters
+    ----------
+    cachedir : str
+        Directory to store results in. Created if it doesn't exist.
+    maxsize : int
+        Maximum total size of cached results in bytes.
+    """
+    suffix = '.pkl'
+
+    def __init__(self, cachedir, maxsize=2**30):
+        self.cachedir = pathlib.Path(cachedir)
+        self.maxsize = maxsize
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _pynec_version():
+        try:
+            return importlib.metadata.version('PyNEC')
+        except importlib.metadata.PackageNotFoundError:
+            return 'unknown'
+
+    @staticmethod
+    def canonical_deck(deck):
+        """\
+        Canonical text of `deck`
+
+        Comment cards are left out and parameters are written with full
+        precision, so that only decks that give the same results match.
+        """
+        lines = []
+        for card in deck:
+            if card[0] in CARDS_COMMT: continue
+            parms = [_p.item() if hasattr(_p, 'item') else _p
+                     for _p in card[1:]]
+            lines.append(' '.join([card[0]] + [repr(_p) for _p in parms]))
+        return '\n'.join(lines)
+
+    def key(self, deck, kind='necout'):
+        """\
+        Cache key for the result `kind` of running `deck`
+        """
+        _hash = hashlib.sha256()
+        for _s in (kind, self._pynec_version(), self.canonical_deck(deck)):
+            _hash.update(_s.encode())
+            _hash.update(b'\0')
+        return _hash.hexdigest()
+
+    def _path(self, key):
+        return self.cachedir / (key + self.suffix)
+
+    def get(self, key):
+        """\
+        Get cached result for `key`, or `None` if there is none
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+        return result
+
+    def put(self, key, result):
+        """\
+        Store `result` under `key` and evict old results if needed
+        """
+        path = self._path(key)
+        path_tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(path_tmp, 'wb') as f:
+            pickle.dump(result, f)
+        os.replace(path_tmp, path)
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for path in self.cachedir.glob('*'+self.suffix):
+            try:
+                entries.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def size(self):
+        """\
+        Total size in bytes of the cached results
+        """
+        return sum(_st.st_size for _st, _ in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda _e: _e[0].st_mtime)
+        totsize = sum(_st.st_size for _st, _ in entries)
+        for _st, path in entries:
+            if totsize <= self.maxsize: break
+            path.unlink(missing_ok=True)
+            totsize -= _st.st_size
+
+    def invalidate(self, key=None):
+        """\
+        Remove the cached result for `key`, or all results if `key` is None
+        """
+        if key is not None:
+            self._path(key).unlink(missing_ok=True)
+            return
+        for _, path in self._entries():
+            path.unlink(missing_ok=True)
+
+    def __contains__(self, key):
+        return self._path(key).exists()
+
+
+class NECcontextCache:
+    """\
+    In-memory cache of solved PyNEC contexts
+
+    A solved context holds the currents on the structure for one frequency
+    and excitation, so radiation patterns for other directions can be
+    computed from it without solving again. Contexts are keyed by the
+    canonical text of their single frequency Deck without its execution
+    cards. The least recently used contexts are evicted when there are more
+    than `maxcount` of them or when the estimated memory of their
+    interaction matrices exceeds `maxmem` bytes.
+
+    Parameters
+    ----------
+    maxcount : int
+        Maximum number of contexts to keep.
+    maxmem : int
+        Maximum estimated memory in bytes of the contexts' matrices.
+    """
+    def __init__(self, maxcount=16, maxmem=2**30):
+        self.maxcount = maxcount
+        self.maxmem = maxmem
+        self._contexts = collections.OrderedDict()
+
+    @staticmethod
+    def key(deck):
+        """\
+        Cache key for the solution of (single frequency) `deck`
+        """
+        _deck = Deck([_c for _c in deck if _c[0] not in {'RP', 'XQ', 'EN'}])
+        return NECcache.canonical_deck(_deck)
+
+    @staticmethod
+    def _matrix_mem(nec_context):
+        # Complex double interaction matrix of size nr of segments squared
+        try:
+            nrsegs = len(nec_context.get_structure_currents(0).get_current())
+        except AttributeError:
+            nrsegs = 0
+        return 16*nrsegs**2
+
+    def get(self, key):
+        """\
+        Get the context for `key`, or `None` if there is none
+        """
+        entry = self._contexts.get(key)
+        if entry is None:
+            return None
+        self._contexts.move_to_end(key)
+        return entry['nec_context']
+
+    def put(self, key, nec_context, nr_radpats=0):
+        """\
+        Store solved `nec_context`, which has `nr_radpats` patterns, as `key`
+        """
+        self._contexts[key] = {'nec_context': nec_context,
+                               'nr_radpats': nr_radpats,
+                               'mem': self._matrix_mem(nec_context)}
+        self._contexts.move_to_end(key)
+        while (len(self._contexts) > self.maxcount
+               or self.memory() > self.maxmem):
+            self._contexts.popitem(last=False)
+
+    def exec_radpat(self, key, radpat):
+        """\
+        Compute radiation pattern `radpat` with the cached context of `key`
+
+        Returns
+        -------
+        radpatnr : int
+            Index of the new radiation pattern in the context's results.
+        """
+        entry = self._contexts[key]
+        PYNEC_CALLS['RP'](entry['nec_context'], *astuple(radpat))
+        entry['nr_radpats'] += 1
+        return entry['nr_radpats'] - 1
+
+    def memory(self):
+        """\
+        Estimated memory in bytes of the cached contexts' matrices
+        """
+        return sum(_e['mem'] for _e in self._contexts.values())
+
+    def clear(self):
+        self._contexts.clear()
+
+    def __len__(self):
+        return len(self._contexts)
+
+    def __contains__(self, key):
+        return key in self._contexts
+
+
+class RunStats:
+    """\
+    Wall time and peak memory per phase of NEC runs
+
+    The phases recorded are:
+
+    'deck'      generation of the NEC deck from the model,
+    'geometry'  input of the geometry cards to PyNEC,
+    'solve'     execution of the control cards by PyNEC, which is where the
+                interaction matrix is filled, factored and solved (PyNEC
+                does these in one call, together with the far-field
+                computation for RP cards),
+    'patterns'  retrieval of input parameters & radiation patterns,
+    'currents'  harvesting of structure currents and port admittances,
+    'postproc'  Python post-processing of the results.
+
+    For each phase the dict `phases` keeps, under the phase's name, the
+    total wall time in seconds ('time'), the nr of times it ran ('count')
+    and two measures of its memory use, in bytes, each the maximum over the
+    times it ran:
+
+    'rss_growth'  growth of the peak resident memory of the process during
+                  the phase. This covers all memory, including that of NEC's
+                  interaction matrix, but is only non-zero for phases that
+                  push the process to a new high-water mark.
+    'alloc_peak'  peak of the Python and numpy memory allocated during the
+                  phase, on top of that allocated at its start, as traced by
+                  tracemalloc. It doesn't cover NEC's own allocations. Only
+                  recorded, from Python 3.9, if `trace_alloc` is True or
+                  tracemalloc is already tracing; else `None`.
+
+    Parameters
+    ----------
+    trace_alloc : bool
+        Start tracemalloc, if it isn't tracing, to record 'alloc_peak'. This
+        slows down Python allocations.
+    """
+
+    def __init__(self, trace_alloc=False):
+        self.phases = {}
+        self._alloc_stack = []  # [allocated at start, peak] of open phases
+        if trace_alloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """\
+        Context manager that records the time spent in it under phase `name`
+        """
+        rss0 = self._max_rss()
+        self._alloc_enter()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - t0
+            alloc_peak = self._alloc_exit()
+            rss_growth = (None if rss0 is None
+                          else self._max_rss() - rss0)
+            self.add(name, wall_time, rss_growth, alloc_peak)
+
+    @staticmethod
+    def _max_rss():
+        # Peak resident memory of the process so far, in bytes
+        if resource is None:
+            return None
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return maxrss if sys.platform == 'darwin' else maxrss*1024
+
+    @staticmethod
+    def _alloc_tracing():
+        return (tracemalloc.is_tracing()
+                and hasattr(tracemalloc, 'reset_peak'))  # Python >= 3.9
+
+    def _alloc_enter(self):
+        if not self._alloc_tracing():
+            self._alloc_stack.append(None)
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        if self._alloc_stack and self._alloc_stack[-1] is not None:
+            # Keep the enclosing phase's peak before resetting it
+            self._alloc_stack[-1][1] = max(self._alloc_stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._alloc_stack.append([current, current])
+
+    def _alloc_exit(self):
+        _entry = self._alloc_stack.pop()
+        if _entry is None or not self._alloc_tracing():
+            return None
+        start, peak = _entry
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self._alloc_stack and self._alloc_stack[-1] is not None:
+            self._alloc_stack[-1][1] = max(self._alloc_stack[-1][1], peak)
+        return peak - start
+
+    def add(self, name, wall_time, rss_growth=None, alloc_peak=None,
+            count=1):
+        """\
+        Add `wall_time` seconds of `count` runs, and their memory, to phase
+        """
+        _ph = self.phases.setdefault(name, {'time': 0., 'count': 0,
+                                            'rss_growth': None,
+                                            'alloc_peak': None})
+        _ph['time'] += wall_time
+        _ph['count'] += count
+        for _key, _mem in (('rss_growth', rss_growth),
+                           ('alloc_peak', alloc_peak)):
+            if _mem is not None:
+                _ph[_key] = max(_ph[_key] or 0, _mem)
+
+    def merge(self, other):
+        """\
+        Add the phases of RunStats `other`, e.g. from a worker, to these
+        """
+        for name, _ph in other.phases.items():
+            self.add(name, _ph['time'], _ph['rss_growth'], _ph['alloc_peak'],
+                     _ph['count'])
+        return self
+
+    def total_time(self):
+        return sum(_ph['time'] for _ph in self.phases.values())
+
+    def __str__(self):
+        lines = [f"{'phase':10s} {'time/s':>10s} {'count':>7s} "
+                 f"{'rss+/MB':>9s} {'alloc/MB':>9s}"]
+        for name, _ph in self.phases.items():
+            mems = ['' if _ph[_key] is None else f"{_ph[_key]/2**20:9.1f}"
+                    for _key in ('rss_growth', 'alloc_peak')]
+            lines.append(f"{name:10s} {_ph['time']:10.4f} {_ph['count']:7d} "
+                         f"{mems[0]:>9s} {mems[1]:>9s}")
+        lines.append(f"{'total':10s} {self.total_time():10.4f}")
+        return '\n'.join(lines)
+
+
+def _phase(stats, name):
+    # Time phase `name` in RunStats `stats`, unless it is None
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.phase(name)
+
+
+@dataclass
+class ProgressEvent:
+    """\
+    Progress of a task, as passed to progress callbacks
+
+    `eta` is the estimated time in seconds left, based on the mean time of
+    the steps done so far, and is `None` until a step is done.
+    """
+    task: str
+    done: int
+    total: int
+    elapsed: float
+    eta: float = None
+
+
+class _Progress:
+    # Emits ProgressEvents for `total` steps of `task` to `callback`
+    def __init__(self, task, total, callback=None):
+        self.task = task
+        self.total = total
+        self.callback = callback
+        self.t0 = time.perf_counter()
+
+    def step(self, done):
+        if self.callback is None:
+            return
+        elapsed = time.perf_counter() - self.t0
+        eta = elapsed/done*(self.total-done) if done else None
+        self.callback(ProgressEvent(self.task, done, self.total, elapsed,
+                                    eta))
+
+
+def _map_workers(func, workers, *iterables):
+    """\
+    Map `func` over `iterables` serially or on `workers`
+
+    `workers` can be `None` (serial), an int (nr of processes in a pool
+    that is created and shut down here) or a concurrent.futures.Executor.
+    Results are yielded in input order.
+    """
+    executor = workers
+    if isinstance(workers, int):
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    if executor is None:
+        yield from map(func, *iterables)
+        return
+    try:
+        yield from executor.map(func, *iterables)
+    finally:
+        if executor is not workers:
+            executor.shutdown()
+
+
+def _freq_matrices(mats, nrfreqs):
+    """\
+    Matrices as a (nrfreqs, nant, nant) array
+
+    `mats` can be one (nant, nant) matrix for all frequencies, or have shape
+    (nrfreqs, nant, nant) or (nrfreqs, 1, 1, 1, nant, nant), as used for
+    loads that broadcast over directions.
+    """
+    mats = np.asarray(mats)
+    nant = mats.shape[-1]
+    if mats.ndim > 3:
+        mats = mats.reshape((mats.shape[0], nant, nant))
+    return np.broadcast_to(mats, (nrfreqs, nant, nant))
+
+
+def _apply_freq_matrices(mats, antspats, solve=False):
+    """\
+    Multiply, or solve, antenna patterns with per frequency matrices
+
+    For each frequency f, computes mats[f] @ X, or solves mats[f] @ Y = X,
+    where the columns of X are the patterns over the antennas for all the
+    directions and polarizations. So each matrix is used, or factored, once
+    per frequency rather than once per direction. When solving, the factored
+    N x N matrix is applied to all the columns as one matrix product, since
+    numpy's multiple right-hand side solve is several times slower than that.
+
+    Parameters
+    ----------
+    mats : array
+        Matrices over antennas, see _freq_matrices().
+    antspats : array
+        Patterns with indices [ant, freq, theta, phi, pol].
+    solve : bool
+        Solve rather than multiply.
+
+    Returns
+    -------
+    antspats_tr : array
+        Transformed patterns, with same shape as `antspats`.
+    """
+    if antspats.size == 0:
+        return np.copy(antspats)
+    nant, nrfreqs = antspats.shape[:2]
+    mats = _freq_matrices(mats, nrfreqs)
+    cols = antspats.reshape((nant, nrfreqs, -1)).swapaxes(0, 1)
+    if solve:
+        mats = np.linalg.inv(mats)
+    # Matrices are inverted in their own precision but applied in that of
+    # the patterns, so single precision patterns stay single precision.
+    mats = mats.astype(np.result_type(antspats.dtype, np.complex64),
+                       copy=False)
+    cols_tr = mats @ cols
+    return cols_tr.swapaxes(0, 1).reshape(antspats.shape)
+
+
+def _scale_pats(antspats, factor):
+    # antspats*factor in the precision of antspats
+    return antspats * np.asarray(factor).astype(
+        np.result_type(antspats.dtype, np.complex64), copy=False)
+
+
+def _fill_lower_from_upper(mats):
+    # Set the lower triangles of the (..., N, N) `mats` to their upper ones
+    # transposed, as for reciprocal admittance or impedance matrices
+    rows, cols = np.tril_indices(mats.shape[-1], -1)
+    mats[..., rows, cols] = mats[..., cols, rows]
+    return mats
+
+
+def _aaa_fit(z, data, nr_support):
+    """\
+    Fit a barycentric rational model to vector valued data with AAA
+
+    Support points are picked greedily, where the current model's error is
+    largest, and the weights, which are shared by all the components, are
+    the least squares null vector of the Loewner matrix of the other points.
+
+    Parameters
+    ----------
+    z : array
+        Sample points, shape (m,).
+    data : array
+        Sampled values, shape (m, nr_components).
+    nr_support : int
+        Number of support points, at most m.
+
+    Returns
+    -------
+    support : list
+        Indices of the support points in `z`.
+    weights : array
+        Barycentric weights of the support points.
+    """
+    support = []
+    weights = None
+    approx = np.broadcast_to(data.mean(axis=0), data.shape)
+    for _ in range(nr_support):
+        err = np.linalg.norm(data - approx, axis=1)
+        err[support] = -1.
+        support.append(int(np.argmax(err)))
+        rest = [_i for _i in range(len(z)) if _i not in support]
+        if not rest:
+            # Interpolating all points: any weights interpolate, so take the
+            # polynomial ones
+            z_s = z[support]
+            weights = 1/np.prod(z_s[:, None] - z_s[None, :]
+                                + np.eye(len(z_s)), axis=1)
+            break
+        cauchy = 1/(z[rest, None] - z[None, support])
+        loewner = ((data[rest][:, None, :] - data[support][None, :, :])
+                   * cauchy[..., None])
+        loewner = np.moveaxis(loewner, -1, 1).reshape((-1, len(support)))
+        _, _, vh = np.linalg.svd(loewner,
+                                 full_matrices=loewner.shape[0] < len(support))
+        weights = vh[-1].conj()
+        approx = _bary_eval(z, z[support], data[support], weights)
+    return support, weights
+
+
+def _bary_eval(z_eval, z_support, data_support, weights):
+    """\
+    Evaluate barycentric rational model at `z_eval`
+
+    `data_support` has the values at the support points along its first
+    axis. Returns the model values with shape (len(z_eval),) +
+    data_support.shape[1:].
+    """
+    z_eval = np.asarray(z_eval, float)
+    diff = z_eval[:, None] - z_support[None, :]
+    exact = diff == 0.
+    diff[exact] = 1.
+    cauchy = weights / diff
+    cauchy[exact.any(axis=1)] = exact[exact.any(axis=1)]
+    vals = np.tensordot(cauchy, data_support, axes=(1, 0))
+    denom = cauchy.sum(axis=1)
+    return vals / denom.reshape((-1,) + (1,)*(vals.ndim-1))
+
 
 def impedanceRLC(freqs, R, L, C, coupling, imp_not_adm=True):
     """
@@ -590,7 +1435,16 @@ class EEPdata:
     Class for Embedded Element Pattern data
 
     Superclass to EEP_SC, EEP_OC, EEP_NO, EEP_TH and EEL
+
+    The patterns of all the embedded elements are held in one contiguous
+    array, see get_antspats_arr(), and the `f_tht` & `f_phi` of the NECout of
+    each element are views into it. The NECouts also share their `freqs`,
+    `thetas` and `phis`.
     """
+    _antspats = None  # Array of patterns [ant, freq, theta, phi, pol]
+    _antspat_views = None  # The (f_tht, f_phi) views set into the NECouts
+    stats = None  # RunStats of the NEC run that produced the data
+
     def __init__(self, eeps, adm_or_imp, excite_typ='SC', adm_or_imp_load=None,
                  excite_val=1.0):
         self.eeps = eeps  # One NecOut (ie EEP) for each excitation (ie element)
@@ -624,36 +1478,345 @@ class EEPdata:
             adm = self.adm_or_imp
             return np.linalg.inv(adm)
 
+    def reciprocity_residual(self):
+        """\
+        Relative reciprocity residual of the admittance or impedance matrix
+
+        The admittance and impedance matrices of a reciprocal array are
+        symmetric, so the residual ||Y - Y^T|| / ||Y||, with Frobenius norms,
+        should be at the level of the accuracy of the solution. NEC's point
+        matching doesn't enforce symmetry, so a large residual flags an
+        under-segmented model or poor convergence without further solves.
+
+        Returns
+        -------
+        residual : array
+            The residual for each frequency.
+        """
+        mat = np.asarray(self.adm_or_imp)
+        mat = mat.reshape((-1,) + mat.shape[-2:])
+        return (np.linalg.norm(mat - np.swapaxes(mat, -1, -2), axis=(-2, -1))
+                / np.linalg.norm(mat, axis=(-2, -1)))
+
     def _get_embedded_elements(self):
         return self.eeps
-    
+
+    def _copy_embedded_elements(self):
+        """\
+        Copy the NECouts, except for their coordinates and patterns
+
+        The copies share `freqs`, `thetas`, `phis`, `f_tht` and `f_phi`
+        with the originals, so they are cheap templates for new patterns set
+        with set_antspat_arr().
+        """
+        return [replace(_ee, inp_V=copy(_ee.inp_V), inp_I=copy(_ee.inp_I),
+                        inp_Z=copy(_ee.inp_Z))
+                for _ee in self._get_embedded_elements()]
+
     def get_antspats_arr(self):
         """\
         Get EEPs as one big array
 
+        The array is built from the NECouts the first time and then returned
+        as is, so it should not be modified in place. It is rebuilt if the
+        `f_tht` or `f_phi` of any NECout has since been reassigned.
+
+        Returns
+        -------
+        antspats: array
+            The radiation patterns for all antennas.
+            The indices are [antnr, freqnr, thetanr, phinr, polnr]
+            polnr=0 is theta and polnr=1 is phi.
+        """
+        if self._antspats is not None and self._antspats_current():
+            return self._antspats
+        eep_list = self._get_embedded_elements()
+        f_tht_mat = np.array([np.atleast_3d(_nec.f_tht) for _nec in eep_list])
+        f_phi_mat = np.array([np.atleast_3d(_nec.f_phi) for _nec in eep_list])
+        antspats = np.stack((f_tht_mat, f_phi_mat), axis=-1)
+        if antspats.shape[-3] == 0:
+            # In the case that there is no radiation patterns,
+            # the atleast_3d() above makes the -2 axis shape 1,
+            # but here I force it to 0 to clearify that there is no theta, phis
+            antspats = antspats.reshape(
+                antspats.shape[:-3] + (0, 0, antspats.shape[-1]))
+        self.set_antspat_arr(antspats)
+        return antspats
+    
+    @staticmethod
+    def _put_antspat(antspats, antnr, necout, nr_ants, dtype=None):
+        """\
+        Put the pattern of `necout` into `antspats` as antenna `antnr`
+
+        `antspats` is allocated, for `nr_ants` antennas and with `dtype`
+        (default that of the pattern), if it is `None`. Returns `antspats`,
+        which stays `None` if there is no pattern.
+        """
+        f_tht = np.asarray(necout.f_tht)
+        if f_tht.ndim != 3 or f_tht.size == 0:
+            return antspats
+        if antspats is None:
+            antspats = np.empty((nr_ants,) + f_tht.shape + (2,),
+                                dtype or f_tht.dtype)
+        antspats[antnr, ..., 0] = f_tht
+        antspats[antnr, ..., 1] = necout.f_phi
+        return antspats
+
+    def set_antspat_arr(self, antspat):
+        """\
+        Set EEPs from one big array
+
+        The array, with indices [antnr, freqnr, thetanr, phinr, polnr], is
+        kept (not copied) and the NECouts' patterns are set to views of it.
+        """
+        self._antspats = antspat
+        eep_list = self._get_embedded_elements()
+        self._antspat_views = []
+        for antnr, _eep in enumerate(eep_list):
+            _eep.f_tht = antspat[antnr, ..., 0]
+            _eep.f_phi = antspat[antnr, ..., 1]
+            self._antspat_views.append((_eep.f_tht, _eep.f_phi))
+            # Share coordinates rather than keep a copy per element
+            _eep.freqs = eep_list[0].freqs
+            if (np.array_equal(_eep.thetas, eep_list[0].thetas)
+                    and np.array_equal(_eep.phis, eep_list[0].phis)):
+                _eep.thetas = eep_list[0].thetas
+                _eep.phis = eep_list[0].phis
+
+    def _antspats_current(self):
+        """\
+        Whether the NECouts' patterns are still the views set from _antspats
+        """
+        eep_list = self._get_embedded_elements()
+        if (self._antspat_views is None
+                or len(eep_list) != len(self._antspat_views)):
+            return False
+        return all(_eep.f_tht is _f_tht and _eep.f_phi is _f_phi
+                   for _eep, (_f_tht, _f_phi)
+                   in zip(eep_list, self._antspat_views))
+
+    def __deepcopy__(self, memo):
+        # Copy attributes, then make the NECouts' patterns views again
+        _copy = self.__class__.__new__(self.__class__)
+        memo[id(self)] = _copy
+        for _attr, _val in vars(self).items():
+            setattr(_copy, _attr, deepcopy(_val, memo))
+        if _copy._antspats is not None:
+            _copy.set_antspat_arr(_copy._antspats)
+        return _copy
+
+    def astype(self, dtype):
+        """\
+        Copy with the patterns in the precision `dtype`
+
+        E.g. np.complex64 halves the memory of the patterns, and the
+        transforms, get_EELs() and form_beams() of the copy then also work
+        in single precision. The admittances or impedances stay in double
+        precision, so the matrices of the transforms are inverted in double.
+        """
+        antspats = self.get_antspats_arr()
+        antspats_new = antspats.astype(dtype)
+        # Give the patterns and their views in the NECouts to deepcopy so
+        # the original precision patterns aren't copied
+        memo = {id(antspats): antspats_new}
+        for antnr, _ee in enumerate(self._get_embedded_elements()):
+            memo[id(_ee.f_tht)] = antspats_new[antnr, ..., 0]
+            memo[id(_ee.f_phi)] = antspats_new[antnr, ..., 1]
+        return deepcopy(self, memo)
+
+    def save(self, path):
+        """\
+        Save to a directory of raw arrays that can be loaded memory-mapped
+
+        The pattern array, the admittances or impedances, the load, the
+        coordinates and the input parameters of the elements are stored as
+        .npy files in the directory `path`, which is created if needed, and
+        the rest in a small JSON file. See load().
+
+        Parameters
+        ----------
+        path : str
+            Directory to save to.
+        """
+        path = pathlib.Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        eeps = self._get_embedded_elements()
+        arrays = {'antspats': self.get_antspats_arr(),
+                  'adm_or_imp': self.adm_or_imp,
+                  'adm_or_imp_load': self.adm_or_imp_load,
+                  'freqs': eeps[0].freqs,
+                  'thetas': eeps[0].thetas,
+                  'phis': eeps[0].phis}
+        for _inp in ('inp_V', 'inp_I', 'inp_Z'):
+            if all(getattr(_ee, _inp) is not None for _ee in eeps):
+                arrays[_inp] = [getattr(_ee, _inp) for _ee in eeps]
+        for _name, _arr in arrays.items():
+            if _arr is not None:
+                np.save(path / (_name + '.npy'), np.asarray(_arr))
+        excite_val = getattr(self, 'excite_val', None)
+        if excite_val is not None:
+            excite_val = [float(np.real(excite_val)),
+                          float(np.imag(excite_val))]
+        meta = {'class': type(self).__name__,
+                'excite_typ': self.excite_typ,
+                'excite_val': excite_val,
+                'f_type': eeps[0].f_type,
+                'nr_ants': len(eeps)}
+        with open(path / 'meta.json', 'w') as f:
+            json.dump(meta, f)
+
+    @staticmethod
+    def load(path, mmap_mode='r'):
+        """\
+        Load EEPdata saved with save()
+
+        The arrays are memory-mapped, so loading doesn't read them and
+        indexing the pattern array, see get_antspats_arr(), or the patterns
+        of an element only reads the bytes of the selected antennas,
+        frequencies or directions.
+
+        Parameters
+        ----------
+        path : str
+            Directory that EEPdata was saved to.
+        mmap_mode : str
+            Memory-map mode, see numpy.load(). The default 'r' is read-only;
+            `None` reads the arrays into memory.
+
+        Returns
+        -------
+        eepdata : EEPdata
+            Instance of the class, e.g. EEP_SC or EELdata, that was saved.
+        """
+        path = pathlib.Path(path)
+        with open(path / 'meta.json') as f:
+            meta = json.load(f)
+
+        def _load(name):
+            _file = path / (name + '.npy')
+            if not _file.exists():
+                return None
+            return np.load(_file, mmap_mode=mmap_mode)
+
+        inps = {_inp: _load(_inp) for _inp in ('inp_V', 'inp_I', 'inp_Z')}
+        freqs = np.load(path / 'freqs.npy').tolist()
+        thetas = _load('thetas')
+        phis = _load('phis')
+        eeps = [NECout(freqs, thetas, phis, None, None, meta['f_type'],
+                       **{_inp: (_arr[antnr] if _arr is not None else None)
+                          for _inp, _arr in inps.items()})
+                for antnr in range(meta['nr_ants'])]
+        adm_or_imp = _load('adm_or_imp')
+        load = _load('adm_or_imp_load')
+        excite_typ = meta['excite_typ']
+        excite_val = meta['excite_val']
+        if excite_val is not None:
+            excite_val = complex(*excite_val)
+            if excite_val.imag == 0.:
+                excite_val = excite_val.real
+        cls = {'EEP_SC': EEP_SC, 'EEP_OC': EEP_OC, 'EEP_NO': EEP_NO,
+               'EEP_TH': EEP_TH, 'EELdata': EELdata}[meta['class']]
+        if cls is EELdata:
+            eepdata = EELdata(eeps, adm_or_imp, excite_typ, load)
+        elif excite_typ == 'NO' or excite_typ == 'TH':
+            eepdata = cls(eeps, adm_or_imp, load, excite_val)
+        else:
+            eepdata = cls(eeps, adm_or_imp, excite_val)
+        eepdata.set_antspat_arr(_load('antspats'))
+        return eepdata
+
+    def form_beams(self, weights, chunksize=2**14):
+        """\
+        Form array beams from a batch of weight vectors
+
+        The beam pattern is the weighted sum of the EEPs, computed per
+        frequency as a matrix product over chunks of directions.
+
+        Parameters
+        ----------
+        weights : array
+            Weights with indices [beamnr, freqnr, antnr], e.g. from
+            ArrayModel.steering_weights().
+        chunksize : int
+            Nr of directions per matrix product, to bound temporary memory.
+
         Returns
         -------
-        antspats: array
-            The radiation patterns for all antennas.
-            The indices are [antnr, freqnr, thetanr, phinr, polnr]
+        beams : array
+            Beam patterns with indices [beamnr, freqnr, thetanr, phinr, polnr]
             polnr=0 is theta and polnr=1 is phi.
         """
-        eep_list = self._get_embedded_elements()
-        f_tht_mat = np.array([np.atleast_3d(_nec.f_tht) for _nec in eep_list])
-        f_phi_mat = np.array([np.atleast_3d(_nec.f_phi) for _nec in eep_list])
-        antspats = np.stack((f_tht_mat, f_phi_mat), axis=-1)
-        if antspats.shape[-3] == 0:
-            # In the case that there is no radiation patterns,
-            # the atleast_3d() above makes the -2 axis shape 1,
-            # but here I force it to 0 to clearify that there is no theta, phis
-            antspats = antspats.reshape(
-                antspats.shape[:-3] + (0, 0, antspats.shape[-1]))
-        return antspats
-    
-    def set_antspat_arr(self, antspat):
-        for antnr, _eep in enumerate(self._get_embedded_elements()):
-            _eep.f_tht = antspat[antnr, ..., 0]
-            _eep.f_phi = antspat[antnr, ..., 1]
+        antspats = self.get_antspats_arr()
+        nant, nfreq = antspats.shape[:2]
+        weights = np.asarray(weights)
+        if weights.shape[1:] != (nfreq, nant):
+            raise ValueError('weights should have shape (nbeam, {}, {})'
+                             .format(nfreq, nant))
+        _pats = antspats.reshape((nant, nfreq, -1))
+        beams = np.empty((weights.shape[0], nfreq, _pats.shape[-1]),
+                         np.result_type(weights, antspats))
+        _nd = 2*chunksize
+        for frqnr in range(nfreq):
+            for _start in range(0, _pats.shape[-1], _nd):
+                _sl = slice(_start, _start+_nd)
+                beams[:, frqnr, _sl] = weights[:, frqnr] @ _pats[:, frqnr, _sl]
+        return beams.reshape(weights.shape[:2] + antspats.shape[2:])
+
+    def to_spherical_waves(self, nmax=None, tol=1e-3, phase_centers=None):
+        """\
+        Convert the EEPs to truncated spherical-wave expansions
+
+        The coefficients are fitted, in the least squares sense, to the
+        patterns on their theta, phi grid, which should cover the sphere
+        (or else the expansion is only valid where there are samples).
+        Taking the antenna positions as `phase_centers` reduces the degree
+        needed, since then the expansions don't have to describe the
+        position phase of the antennas.
+
+        Parameters
+        ----------
+        nmax : int
+            Truncation degree. Default `None` means the smallest degree for
+            which the relative rms residual of the fit is below `tol`.
+        tol : float
+            Tolerance for choosing `nmax`.
+        phase_centers : array
+            Phase center of each antenna in meters, shape (nant, 3), e.g.
+            the array positions. Default `None` means the origin.
+
+        Returns
+        -------
+        swe : SphericalWaveEEP
+            The spherical-wave expansions of the patterns.
+        """
+        eep0 = self._get_embedded_elements()[0]
+        antspats = self.get_antspats_arr()
+        nant, nfreq, nth, nph, _ = antspats.shape
+        if phase_centers is None:
+            phase_centers = np.zeros((nant, 3))
+        phase_centers = np.asarray(phase_centers, float)
+        thetas, phis = np.meshgrid(np.deg2rad(eep0.thetas),
+                                   np.deg2rad(eep0.phis), indexing='ij')
+        khat = np.stack([np.sin(thetas)*np.cos(phis),
+                         np.sin(thetas)*np.sin(phis), np.cos(thetas)], -1)
+        k = 2*np.pi*np.asarray(eep0.freqs)*1e6/C0_NEC
+        phase = np.exp(-1j*k[None, :, None, None]
+                       * np.moveaxis(khat @ phase_centers.T, -1, 0)[:, None])
+        # Patterns as columns, over the directions and polarizations
+        rhs = (antspats*phase[..., None]).reshape((nant*nfreq, -1)).T
+        rhs_norm = np.linalg.norm(rhs)
+        nmaxs = [nmax] if nmax is not None else itertools.count(1)
+        for _nmax in nmaxs:
+            basis = _vsh_basis(_nmax, thetas, phis).reshape(
+                (nth*nph*2, -1))
+            coefs, *_ = np.linalg.lstsq(basis, rhs, rcond=None)
+            residual = np.linalg.norm(basis @ coefs - rhs) / rhs_norm
+            if (nmax is not None or residual < tol
+                    or basis.shape[1] + 2*(2*_nmax+3) > basis.shape[0]):
+                break
+        coefs = coefs.T.reshape((nant, nfreq, -1))
+        return SphericalWaveEEP(coefs, _nmax, list(eep0.freqs), phase_centers,
+                                eep0.f_type)
 
     def get_pow_arr(self):
         if self.excite_typ == 'SC':
@@ -693,24 +1856,25 @@ class EEPdata:
             adm_or_imp_load = self.imp_load
         freqs = self.eeps[0].freqs
         freqs = np.array(freqs)[:, np.newaxis, np.newaxis, np.newaxis]  # Brdcst
-        # Template EELdata initialized with self.eeps which get overwritten
-        # after tranformated eeps are calculated.
-        # Also need to copy epps and adm_or_imp so return obj can be modified
+        # Template EELdata initialized with copies of self.eeps whose
+        # patterns get set after tranformated eeps are calculated.
+        # Also need to copy adm_or_imp so return obj can be modified
         # independently of self.
-        _ees = deepcopy(self.eeps)
+        _ees = self._copy_embedded_elements()
         for _ee in _ees:
             if self.excite_typ == 'OC' or self.excite_typ == 'NO':
                 _ee.f_type = 'Length'
             elif self.excite_typ == 'SC' or self.excite_typ == 'TH':
                 _ee.f_type = 'Length/Impedance'
+        if adm_or_imp_load is not None:
+            adm_or_imp_load = np.copy(adm_or_imp_load)
         eeldata = EELdata(_ees, np.copy(adm_or_imp),
-                          self.excite_typ, np.copy(adm_or_imp_load))
+                          self.excite_typ, adm_or_imp_load)
         antspats = self.get_antspats_arr()
-        antspats = 2.j/(MU0*freqs*1e6*excite_val)*antspats  # 1e6 = MHz to Hz
+        antspats = _scale_pats(antspats,
+                               2.j/(MU0*freqs*1e6*excite_val))  # MHz to Hz
         if self.excite_typ == 'TH':
-            antspats = np.expand_dims(np.moveaxis(antspats, [0], [-1]), -1)
-            antspats = adm_or_imp_load @ antspats
-            antspats = np.moveaxis(antspats.squeeze(-1), [-1], [0])
+            antspats = _apply_freq_matrices(adm_or_imp_load, antspats)
         eeldata.set_antspat_arr(antspats)
         return eeldata
     
@@ -746,14 +1910,165 @@ class EEPdata:
         return True
 
 
+def _legendre_normalized(nmax, thetas):
+    """\
+    Fully normalized associated Legendre functions and their derivatives
+
+    Computes, with the Condon-Shortley phase, P[n, m] = P_n^m(cos(theta)),
+    normalized so that P_n^m(cos(theta))*exp(j*m*phi) are orthonormal on
+    the sphere, Q[n, m] = P[n, m]/sin(theta) for m>0 (0 for m=0), which is
+    finite at the poles, and dP[n, m] = dP_n^m/dtheta, for n, m <= nmax.
+    `thetas` are in radians. The arrays have shape (nmax+1, nmax+1) +
+    thetas.shape.
+    """
+    x = np.cos(thetas)
+    sin = np.sin(thetas)
+    P = np.zeros((nmax+1, nmax+1) + x.shape)
+    Q = np.zeros_like(P)
+    dP = np.zeros_like(P)
+    P[0, 0] = 1/np.sqrt(4*np.pi)
+    for m in range(nmax+1):
+        if m > 0:
+            _c = -np.sqrt((2*m+1)/(2*m))
+            Q[m, m] = _c*P[m-1, m-1]
+            P[m, m] = Q[m, m]*sin
+        if m < nmax:
+            P[m+1, m] = np.sqrt(2*m+3)*x*P[m, m]
+            Q[m+1, m] = np.sqrt(2*m+3)*x*Q[m, m]
+        for n in range(m+2, nmax+1):
+            a_nm = np.sqrt((4*n**2-1)/(n**2-m**2))
+            b_nm = np.sqrt(((n-1)**2-m**2)/(4*(n-1)**2-1))
+            P[n, m] = a_nm*(x*P[n-1, m] - b_nm*P[n-2, m])
+            Q[n, m] = a_nm*(x*Q[n-1, m] - b_nm*Q[n-2, m])
+    for n in range(1, nmax+1):
+        dP[n, 0] = np.sqrt(n*(n+1))*P[n, 1]
+        for m in range(1, n+1):
+            dP[n, m] = n*x*Q[n, m] - np.sqrt((2*n+1)/(2*n-1)
+                                              *(n-m)*(n+m))*Q[n-1, m]
+    return P, Q, dP
+
+
+def _vsh_basis(nmax, thetas, phis):
+    """\
+    Far-field vector spherical harmonics at directions (thetas, phis)
+
+    Returns the theta and phi components of the orthonormal functions
+    Psi_nm = grad(Y_nm)/sqrt(n(n+1)) and Phi_nm = rhat x Psi_nm, for
+    n = 1..nmax and m = -n..n, with shape thetas.shape + (2, 2*nmax*(nmax+2)).
+    The Psi_nm come first, in the order (n, m), followed by the Phi_nm.
+    Angles are in radians.
+    """
+    thetas = np.asarray(thetas, float)
+    phis = np.asarray(phis, float)
+    _, Q, dP = _legendre_normalized(nmax, thetas)
+    nr_nm = nmax*(nmax+2)
+    basis = np.empty(thetas.shape + (2, 2*nr_nm), complex)
+    _idx = 0
+    for n in range(1, nmax+1):
+        _norm = 1/np.sqrt(n*(n+1))
+        for m in range(-n, n+1):
+            _sgn = (-1)**m if m < 0 else 1
+            _exp = _sgn*_norm*np.exp(1j*m*phis)
+            psi_tht = dP[n, abs(m)]*_exp
+            psi_phi = 1j*m*Q[n, abs(m)]*_exp
+            basis[..., 0, _idx] = psi_tht
+            basis[..., 1, _idx] = psi_phi
+            basis[..., 0, nr_nm+_idx] = -psi_phi
+            basis[..., 1, nr_nm+_idx] = psi_tht
+            _idx += 1
+    return basis
+
+
+class SphericalWaveEEP:
+    """\
+    Embedded element patterns as truncated spherical-wave expansions
+
+    The far-field pattern of antenna `a` at frequency `f` is
+
+        E(khat) = exp(j*k*khat.r_a) * sum_nm (a_nm Psi_nm + b_nm Phi_nm)
+
+    where Psi_nm and Phi_nm are the far-field vector spherical harmonics up
+    to degree `nmax` and r_a is the phase center of the antenna. Made with
+    EEPdata.to_spherical_waves().
+
+    Attributes
+    ----------
+    coefs : array
+        Coefficients with indices [antnr, freqnr, coefnr], where the a_nm,
+        in order of (n, m), come before the b_nm.
+    nmax : int
+        Truncation degree.
+    freqs : list
+        Frequencies in MHz.
+    phase_centers : array
+        Phase center of each antenna, shape (nant, 3), in meters.
+    f_type : str
+        Type of the pattern, as in NECout.
+    """
+
+    def __init__(self, coefs, nmax, freqs, phase_centers, f_type='Electric'):
+        self.coefs = coefs
+        self.nmax = nmax
+        self.freqs = freqs
+        self.phase_centers = phase_centers
+        self.f_type = f_type
+
+    def eval(self, thetas, phis, chunksize=2**14):
+        """\
+        Evaluate the patterns at arbitrary directions
+
+        Parameters
+        ----------
+        thetas, phis : array
+            Directions in degrees. They are broadcast together.
+        chunksize : int
+            Nr of directions evaluated at a time, to bound memory use.
+
+        Returns
+        -------
+        antspats : array
+            Patterns with indices [antnr, freqnr, dirs..., polnr], where
+            dirs are the broadcast shape of `thetas` and `phis`, and polnr=0
+            is theta and polnr=1 is phi, as from get_antspats_arr().
+        """
+        thetas, phis = np.broadcast_arrays(np.deg2rad(thetas),
+                                           np.deg2rad(phis))
+        dirs_shape = thetas.shape
+        thetas = thetas.ravel()
+        phis = phis.ravel()
+        nant, nfreq, _ = self.coefs.shape
+        k = 2*np.pi*np.asarray(self.freqs)*1e6/C0_NEC
+        antspats = np.empty((nant, nfreq, len(thetas), 2), complex)
+        for _start in range(0, len(thetas), chunksize):
+            _sl = slice(_start, _start+chunksize)
+            _tht, _phi = thetas[_sl], phis[_sl]
+            basis = _vsh_basis(self.nmax, _tht, _phi)
+            _pats = np.einsum('dpk,afk->afdp', basis, self.coefs)
+            khat = np.stack([np.sin(_tht)*np.cos(_phi),
+                             np.sin(_tht)*np.sin(_phi), np.cos(_tht)], -1)
+            phase = np.exp(1j*k[None, :, None]
+                           * (khat @ self.phase_centers.T).T[:, None, :])
+            antspats[:, :, _sl] = _pats*phase[..., None]
+        return antspats.reshape((nant, nfreq) + dirs_shape + (2,))
+
+    def compression_ratio(self, nr_directions):
+        """\
+        Ratio of the size of gridded patterns with `nr_directions` to this
+        """
+        return 2*nr_directions/self.coefs.shape[-1]
+
+
 class EEP_SC(EEPdata):
-    def __init__(self, eep_sc, admittances_arr, voltage_excite=1.0):
+    def __init__(self, eep_sc, admittances_arr, voltage_excite=1.0,
+                 structure_currents=None):
         # Set up super, EEPdata, stuff first:
         super().__init__(eep_sc, admittances_arr, excite_typ='SC',
                          adm_or_imp_load=None, excite_val=voltage_excite)
         # Set up EEP_SC specific
         self.admittances = admittances_arr
         self.voltage_excite = voltage_excite
+        # StructureCurrents with the currents captured for each excitation
+        self.structure_currents = structure_currents
     
     def transform_to(self, excite_typ, excite_val=1., adm_load=None):
         """
@@ -775,24 +2090,18 @@ class EEP_SC(EEPdata):
             return deepcopy(self)
         # _ee is placeholder var: gets overwritten before returning when
         # method .set_antspats_arr() is called
-        _ee = deepcopy(self._get_embedded_elements())
+        _ee = self._copy_embedded_elements()
         imp_arr = self.get_impedances()
-        ap_SC = self.get_antspats_arr()
         # Note: antspats arr shape = (nrant, nrfreq, nrtheta, nrphi, nrpol)
-        #       so ant-axis (0) should be moved to end and the end extended
-        #       by one dimension so that it appears as stack of column vectors:
-        #           antspat_SC[freq,theta,phi,pol, ants, 1] ...
-        ap_SC = np.expand_dims(np.moveaxis(ap_SC, [0], [-1]), -1)
+        #       and for each freq the matrices below are applied to the
+        #       (nrant, nrtheta*nrphi*nrpol) matrix of patterns.
+        ap_SC = self.get_antspats_arr()
         # Normalize antspats_SC with excite voltages and current:
-        ap_SC_0 = ap_SC * excite_val / self.voltage_excite
+        ap_SC_0 = _scale_pats(ap_SC, excite_val / self.voltage_excite)
         if excite_typ == 'OC':
             eepdat_tr = EEP_OC(_ee, np.copy(imp_arr), excite_val)
-        #       ... so it can be matmul (@) with e.g.
-        #           imp_arr[freqs, np.newaxis, newaxis, np.newaxis, ants, ants]
-        #       after expanding the axes 1,2,3:
-            _imp_arr_ext = np.expand_dims(imp_arr, axis=(1,2,3))
             # Warnick2021 eq. 7
-            antspat_tr = _imp_arr_ext @ ap_SC_0
+            antspat_tr = _apply_freq_matrices(imp_arr, ap_SC_0)
         elif excite_typ == 'TH':
             raise NotImplementedError('Transform from SC -> TH not implemented')
         elif excite_typ == 'NO':
@@ -804,10 +2113,10 @@ class EEP_SC(EEPdata):
             # Create new EEP_NO object to hold results to be return:ed
             adm_arr = np.copy(self.get_admittances())
             eepdat_tr = EEP_NO(_ee, adm_arr, adm_load, excite_val)
-            _adm_arr_ext = np.expand_dims(adm_arr, axis=(1,2,3))
             # Warnick2021 eq. 6
-            antspat_tr = np.linalg.inv(adm_load + _adm_arr_ext) @ ap_SC_0
-        antspat_tr = np.moveaxis(antspat_tr.squeeze(-1), [-1], [0])
+            antspat_tr = _apply_freq_matrices(
+                _freq_matrices(adm_load, len(adm_arr)) + adm_arr, ap_SC_0,
+                solve=True)
         eepdat_tr.set_antspat_arr(antspat_tr)
         return eepdat_tr
 
@@ -823,27 +2132,25 @@ class EEP_OC(EEPdata):
     def transform_to(self, excite_typ, excite_val=1., imp_load=None):
         if excite_typ == self.excite_typ:
             return deepcopy(self)
-        _ee = deepcopy(self._get_embedded_elements())
+        _ee = self._copy_embedded_elements()
         ap_OC = self.get_antspats_arr()
-        ap_OC = np.expand_dims(np.moveaxis(ap_OC, [0], [-1]), -1)
-        ap_OC_0 = ap_OC * excite_val / self.current_excite
+        ap_OC_0 = _scale_pats(ap_OC, excite_val / self.current_excite)
         if excite_typ == 'SC':
             adm_arr = np.copy(self.get_admittances())
             eepdat_tr = EEP_SC(_ee, adm_arr, excite_val)
-            _adm_arr_ext = np.expand_dims(adm_arr, axis=(1,2,3))
             # Warnick2021 eq. 7
-            antspat_tr = _adm_arr_ext @ ap_OC_0
+            antspat_tr = _apply_freq_matrices(adm_arr, ap_OC_0)
         elif excite_typ == 'TH':
             imp_arr = np.copy(self.get_impedances())
             if np.isscalar(imp_load):
                 imp_load = imp_load*np.identity(imp_arr.shape[-1])
             eepdat_tr = EEP_TH(_ee, imp_arr, imp_load, excite_val)
-            _imp_arr_ext = np.expand_dims(imp_arr, axis=(1,2,3))
             # Warnick2021 eq. 4
-            antspat_tr = np.linalg.inv(imp_load + _imp_arr_ext) @ ap_OC_0
+            antspat_tr = _apply_freq_matrices(
+                _freq_matrices(imp_load, len(imp_arr)) + imp_arr, ap_OC_0,
+                solve=True)
         elif excite_typ == 'NO':
             raise NotImplementedError('Transform from OC -> NO not implemented')
-        antspat_tr = np.moveaxis(antspat_tr.squeeze(-1), [-1], [0])
         eepdat_tr.set_antspat_arr(antspat_tr)
         return eepdat_tr
 
@@ -860,21 +2167,20 @@ class EEP_NO(EEPdata):
     def transform_to(self, excite_typ, excite_val=1.):
         if excite_typ == self.excite_typ:
             return deepcopy(self)
-        _ee = deepcopy(self._get_embedded_elements())
+        _ee = self._copy_embedded_elements()
         adm_arr = self.get_admittances()
         ap_NO = self.get_antspats_arr()
-        ap_NO = np.expand_dims(np.moveaxis(ap_NO [0], [-1]), -1)
-        ap_NO_0 = ap_NO * excite_val / self.current_excite
+        ap_NO_0 = _scale_pats(ap_NO, excite_val / self.current_excite)
         if excite_typ == 'SC':
             eepdat_tr = EEP_SC(_ee, np.copy(adm_arr), excite_val)
-            _adm_arr_ext = np.expand_dims(adm_arr, axis=(1,2,3))
-            # Warnick2021 eq. 6
-            antspat_tr = np.linalg.inv(self.adm_load + _adm_arr_ext) @ ap_NO_0
+            # Warnick2021 eq. 6 (inverse of SC -> NO)
+            antspat_tr = _apply_freq_matrices(
+                _freq_matrices(self.adm_load, len(adm_arr)) + adm_arr,
+                ap_NO_0)
         elif excite_typ == 'OC':
             raise NotImplementedError('Transform from NO -> OC not implemented')
         elif excite_typ == 'TH':
             raise NotImplementedError('Transform from NO -> TH not implemented')
-        antspat_tr = np.moveaxis(antspat_tr.squeeze(-1), [-1], [0])
         eepdat_tr.set_antspat_arr(antspat_tr)
         return eepdat_tr
 
@@ -891,21 +2197,20 @@ class EEP_TH(EEPdata):
     def transform_to(self, excite_typ, excite_val=1.):
         if excite_typ == self.excite_typ:
             return deepcopy(self)
-        _ee = deepcopy(self._get_embedded_elements())
+        _ee = self._copy_embedded_elements()
         imp_arr = self.impedances
         ap_TH = self.get_antspats_arr()
-        ap_TH = np.expand_dims(np.moveaxis(ap_TH, [0], [-1]), -1)
-        ap_TH_0 = ap_TH * excite_val / self.current_excite
+        ap_TH_0 = _scale_pats(ap_TH, excite_val / self.voltage_excite)
         if excite_typ == 'SC':
             raise NotImplementedError('Transform from TH -> SC not implemented')
         elif excite_typ == 'OC':
             eepdat_tr = EEP_OC(_ee, np.copy(imp_arr), excite_val)
-            _imp_arr_ext = np.expand_dims(imp_arr, axis=(1,2,3))
             # Warnick2021 eq. 4
-            antspat_tr = (self.imp_load + _imp_arr_ext) @ ap_TH_0
+            antspat_tr = _apply_freq_matrices(
+                _freq_matrices(self.imp_load, len(imp_arr)) + imp_arr,
+                ap_TH_0)
         elif excite_typ == 'NO':
             raise NotImplementedError('Transform from TH -> NO not implemented')
-        antspat_tr = np.moveaxis(antspat_tr.squeeze(-1), [-1], [0])
         eepdat_tr.set_antspat_arr(antspat_tr)
         return eepdat_tr
     
@@ -947,27 +2252,26 @@ class EELdata(EEPdata):
         if self.excite_typ != 'TH' and self.excite_typ != 'NO':
             raise NotImplementedError(
                 f'Excite type is {self.excite_typ} but only TH and NO loading')
-        area_effs = []
         load_adm_or_imp = self.adm_or_imp_load
         if load_adm_or_imp.ndim == 2:
             load_adm_or_imp_ = np.diagonal(self.adm_or_imp_load,
                                            axis1=-2, axis2=-1)
+            # Broadcast over [ant, frq, tht, phi]
+            load_adm_or_imp_ = load_adm_or_imp_[:, None, None, None]
         else:
             load_adm_or_imp_ = np.squeeze(
                 np.moveaxis(
                     np.diagonal(self.adm_or_imp_load, axis1=-2, axis2=-1),
                 -1, 0),
             -1)
-        for eel, aoi_l in zip(self.eels, load_adm_or_imp_):
-            a_e_cmplx_un = ETA0 / 2 * (np.abs(eel.f_tht)**2
-                                       +np.abs(eel.f_phi)**2)
-            if self.excite_typ == 'TH':
-                a_e_cmplx = 1/aoi_l * a_e_cmplx_un
-            elif self.excite_typ == 'NO':
-                a_e_cmplx = aoi_l * a_e_cmplx_un
-            a_e = np.real(a_e_cmplx)
-            area_effs.append(a_e)
-        area_effs = np.asarray(area_effs)
+        antspats = self.get_antspats_arr()
+        a_e_cmplx_un = ETA0 / 2 * (np.abs(antspats[..., 0])**2
+                                   +np.abs(antspats[..., 1])**2)
+        if self.excite_typ == 'TH':
+            a_e_cmplx = 1/load_adm_or_imp_ * a_e_cmplx_un
+        elif self.excite_typ == 'NO':
+            a_e_cmplx = load_adm_or_imp_ * a_e_cmplx_un
+        area_effs = np.real(a_e_cmplx)
         return area_effs
 
 
@@ -1077,6 +2381,8 @@ class TaggedGroup:
 
 
 class StructureModel:
+    _geom_cache = None  # (geometry key, geometry section cards)
+    _ctrl_cache = None  # Control prefix cards per execution block setup
 
     def __init__(self, name='Model_'):
         self.name = name
@@ -1260,17 +2566,35 @@ class StructureModel:
     def _create_excite_exclusive_groups(self, d, _exciteports, exciteports_grp):
         pass
 
-    def as_neccards(self, exclude_groups=None):
+    def _geometry_key(self, exclude_groups):
         """\
-        Return a Deck() object that corresponds to this StructureModel() object
+        Key of everything the geometry section of the deck depends on
+
+        It is compared, rather than hashed, to the key of the cached section,
+        so the cache is invalidated by any change of the comments, the ground,
+        the groups and their tags, or the parts' geometry and segmentation.
         """
+        parts_key = tuple(
+            (gid, self.groups[gid]._tag_nr,
+             tuple((type(_p), tuple(_p.point_src), tuple(_p.point_dst),
+                    _p.radius, _p.nr_seg)
+                   for _p in self.groups[gid].parts.values()))
+            for gid in self.groups)
+        gpflag = self.ground['gpflag'] if self.ground else 0
+        return (tuple(self.comments), gpflag, tuple(exclude_groups),
+                parts_key)
+
+    def _geometry_section(self, exclude_groups):
+        # Comment and geometry cards, reused while _geometry_key() is the same
+        key = self._geometry_key(exclude_groups)
+        if self._geom_cache is not None and self._geom_cache[0] == key:
+            return self._geom_cache[1]
         d = Deck()
-        
+
         # Comments
         for comment in self.comments:
             d.append_card('CM', ' '+comment)
         d.append_card('CE', '')
-        exclude_groups = {} if exclude_groups is None else exclude_groups
         nonelemgrp = set(self.groups)-set(exclude_groups)
 
         # Structure Geometry for non element groups
@@ -1284,26 +2608,59 @@ class StructureModel:
         if self.ground:
             gpflag = self.ground['gpflag']
         d.append_card('GE', gpflag)
+        self._geom_cache = (key, d.carddeck)
+        return d.carddeck
+
+    def _control_prefix(self, exblk):
+        # EK, GN and FR cards that start the control of an execution block
+        _freqsteps = exblk.freqsteps
+        key = (exblk.ext_thinwire,
+               astuple(_freqsteps) if _freqsteps else None,
+               self.ground['grnd'].astuple() if self.ground else None)
+        if self._ctrl_cache is None:
+            self._ctrl_cache = {}
+        cards = self._ctrl_cache.get(key)
+        if cards is not None:
+            return cards
+        d = Deck()
+
+        # Extended Thin-Wire Kernel option?
+        if exblk.ext_thinwire:
+            d.append_card('EK', 1)
+
+        # Ground (a block without freqsteps continues the previous
+        # block, so its ground is kept and the factored matrix reused)
+        if self.ground and _freqsteps:
+            d.append_card('GN', *(self.ground['grnd'].astuple()))
+
+        if _freqsteps:
+        # Frequency
+            I1, I2 = _freqsteps.to_nec_type(), _freqsteps.nrsteps
+            F1, F2 = _freqsteps.start, _freqsteps.incr
+            d.append_card('FR', I1, I2, F1, F2)
+        if len(self._ctrl_cache) >= 64:
+            self._ctrl_cache.clear()
+        self._ctrl_cache[key] = d.carddeck
+        return d.carddeck
+
+    def as_neccards(self, exclude_groups=None):
+        """\
+        Return a Deck() object that corresponds to this StructureModel() object
+
+        The comment and geometry cards, and the cards that set up the kernel,
+        ground and frequencies of each execution block, are cached and only
+        generated anew when what they depend on has changed, so that decks of
+        a model that only differ in their excitations are quick to make.
+        """
+        exclude_groups = {} if exclude_groups is None else exclude_groups
+        nonelemgrp = set(self.groups)-set(exclude_groups)
+        d = Deck(list(self._geometry_section(exclude_groups)))
 
         # Program Control (loop over self.executionblocks)
         for _exblk in self.executionblocks.values():
-            _freqsteps = _exblk.freqsteps
             _exciteports = _exblk.exciteports
             _radpat = _exblk.radpat
-
-            # Extended Thin-Wire Kernel option?
-            if _exblk.ext_thinwire:
-                d.append_card('EK', 1)
-            
-            # Ground
-            if self.ground:
-                d.append_card('GN', *(self.ground['grnd'].astuple()))
-
-            if _freqsteps:
-            # Frequency
-                I1, I2 = _freqsteps.to_nec_type(), _freqsteps.nrsteps
-                F1, F2 = _freqsteps.start, _freqsteps.incr
-                d.append_card('FR', I1, I2, F1, F2)
+            d.append_cards(self._control_prefix(_exblk))
 
             # Excitations
             # ... non element group
@@ -1323,51 +2680,236 @@ class StructureModel:
         d.append_card('EN', 0)
         return d
     
-    def get_necout(self, eb, save_necfile=False, eb_id_suffix=''):
+    @staticmethod
+    def _read_necout(nec_context, freqs, resnrs=None, radpatnrs=None):
+        """\
+        Read NEC results from a solved PyNEC context into a NECout
+
+        Parameters
+        ----------
+        nec_context : PyNEC.nec_context
+            Context that has been executed.
+        freqs : list
+            Frequencies in MHz of the results to read.
+        resnrs : list
+            Result index in `nec_context` for each frequency. Default `None`
+            means results are indexed by frequency number.
+        radpatnrs : list
+            Radiation pattern result index for each frequency, if different
+            from `resnrs`. `None` entries mean there is no pattern.
+        """
+        if resnrs is None:
+            resnrs = range(len(freqs))
+        if radpatnrs is None:
+            radpatnrs = resnrs
+        ef_vert = []
+        ef_hori = []
+        voltages = []
+        currents = []
+        impedances = []
+        thetas = None
+        phis = None
+        for resnr, radpatnr in zip(resnrs, radpatnrs):
+            # Input (excitation) parameters
+            inp_parms = nec_context.get_input_parameters(resnr)
+            # ##frequency = inp_parms.get_frequency()
+            voltages.append(inp_parms.get_voltage())
+            currents.append(inp_parms.get_current())
+            impedances.append(inp_parms.get_impedance())
+
+            # Radiation pattern
+            radpat_out = None
+            if radpatnr is not None:
+                radpat_out = nec_context.get_radiation_pattern(radpatnr)
+            # Coordinates theta,phi are the same for all frequecies,
+            # but easiest to just get it for each freq spec.
+            if radpat_out:
+                thetas = radpat_out.get_theta_angles()
+                phis = radpat_out.get_phi_angles()
+                # Fields
+                ef_vert_fr = radpat_out.get_e_theta()
+                ef_vert_fr = ef_vert_fr.reshape(
+                                        (len(phis), len(thetas))).T
+                ef_hori_fr = radpat_out.get_e_phi()
+                ef_hori_fr = ef_hori_fr.reshape(
+                                        (len(phis), len(thetas))).T
+                ef_hori.append(ef_hori_fr)
+                ef_vert.append(ef_vert_fr)
+            else:
+                thetas = None
+                phis = None
+        necout = NECout(freqs, thetas, phis, np.array(ef_vert),
+                        np.array(ef_hori), inp_V=np.array(voltages),
+                        inp_I=np.array(currents),
+                        inp_Z=np.array(impedances))
+        return necout
+
+    def get_necout(self, eb, save_necfile=False, eb_id_suffix='',
+                   workers=None, nrfreqchunks=None, cache=None,
+                   context_cache=None, stats=None):
+            """\
+            Run NEC on this model with execution block `eb`
+
+            Parameters
+            ----------
+            eb : ExecutionBlock
+                The execution block to run.
+            save_necfile : bool
+                Save the deck as a NEC file named after the model.
+            eb_id_suffix : str
+                Suffix to execution block id and NEC file name.
+            workers : int or concurrent.futures.Executor
+                Split the frequency sweep into chunks, each with its own FR
+                card, and run them in parallel in a process pool with this
+                many worker processes or on the given executor.
+                Default `None` runs the whole sweep in this process.
+            nrfreqchunks : int
+                Number of frequency chunks when `workers` is used. Default is
+                the nr of workers, or the nr of CPUs if an executor is given.
+            cache : NECcache
+                Cache to get the NECout from, if this deck has been run
+                before, or else to store it in. Default `None` means no cache.
+            context_cache : NECcontextCache
+                Cache of solved contexts, one per frequency. If the model has
+                been solved before for a frequency and excitation, only the
+                radiation pattern is computed. Can't be used with `workers`.
+            stats : RunStats
+                Record the time spent in each phase of the run in this.
+                Phases run on `workers` are not recorded.
+
+            Returns
+            -------
+            necout : NECout
+                NEC output for the frequency sweep.
+            nec_context : PyNEC.nec_context
+                The last executed PyNEC context, or `None` if run on workers
+                or if the result came from the cache.
+            """
             self.add_executionblock('eb'+eb_id_suffix, eb, reset=True)
-            _deck = self.as_neccards()
+            with _phase(stats, 'deck'):
+                _deck = self.as_neccards()
             if save_necfile:
                 _deck.save_necfile(self.name+eb_id_suffix)
-            freqs = eb.freqsteps.aslist()
-            for nec_context in _deck.exec_pynec():
-                ef_vert = []
-                ef_hori = []
-                voltages = []
-                currents = []
-                impedances = []
-                for f in range(len(freqs)):
-                    # Input (excitation) parameters
-                    inp_parms = nec_context.get_input_parameters(f)
-                    # ##frequency = inp_parms.get_frequency()
-                    voltages.append(inp_parms.get_voltage())
-                    currents.append(inp_parms.get_current())
-                    impedances.append(inp_parms.get_impedance())
-
-                    # Radiation pattern
-                    radpat_out = nec_context.get_radiation_pattern(f)
-                    # Coordinates theta,phi are the same for all frequecies,
-                    # but easiest to just get it for each freq spec.
-                    if radpat_out:
-                        thetas = radpat_out.get_theta_angles()
-                        phis = radpat_out.get_phi_angles()
-                        # Fields
-                        ef_vert_fr = radpat_out.get_e_theta()
-                        ef_vert_fr = ef_vert_fr.reshape(
-                                                (len(phis), len(thetas))).T
-                        ef_hori_fr = radpat_out.get_e_phi()
-                        ef_hori_fr = ef_hori_fr.reshape(
-                                                (len(phis), len(thetas))).T
-                        ef_hori.append(ef_hori_fr)
-                        ef_vert.append(ef_vert_fr)
-                    else:
-                        thetas = None
-                        phis = None
-                necout = NECout(freqs, thetas, phis, np.array(ef_vert),
-                                np.array(ef_hori), inp_V=np.array(voltages),
-                                inp_I=np.array(currents),
-                                inp_Z=np.array(impedances))
+            if cache is not None:
+                _key = cache.key(_deck)
+                necout = cache.get(_key)
+                if necout is not None:
+                    return necout, None
+            if context_cache is not None:
+                if workers is not None:
+                    raise ValueError(
+                        'context_cache cannot be combined with workers')
+                necout, nec_context = self._get_necout_ctxcached(
+                    eb, context_cache)
+                self.add_executionblock('eb'+eb_id_suffix, eb, reset=True)
+            elif workers is not None:
+                necout, nec_context = self._get_necout_freqchunked(
+                    eb, workers, nrfreqchunks)
+            else:
+                freqs = eb.freqsteps.aslist()
+                for nec_context in _deck.exec_pynec(stats=stats):
+                    with _phase(stats, 'patterns'):
+                        necout = self._read_necout(nec_context, freqs)
+            if cache is not None:
+                cache.put(_key, necout)
             return necout, nec_context
 
+    def iter_necout(self, eb, save_necfile=False, eb_id_suffix='',
+                    stats=None):
+        """\
+        Run NEC on this model with execution block `eb` one frequency at a time
+
+        This is a generator version of get_necout() that yields the results
+        for each frequency as soon as they have been computed, so the whole
+        frequency sweep doesn't need to be held in memory. Each frequency is
+        run in a new PyNEC context.
+
+        Parameters
+        ----------
+        eb : ExecutionBlock
+            The execution block to run.
+        save_necfile : bool
+            Save the deck, for the whole sweep, as a NEC file named after the
+            model.
+        eb_id_suffix : str
+            Suffix to execution block id and NEC file name.
+        stats : RunStats
+            Record the time spent in each phase of the run in this.
+
+        Yields
+        ------
+        necout_f : NECout
+            NEC output for one frequency.
+        nec_context : PyNEC.nec_context
+            The executed PyNEC context of the frequency, with result index 0,
+            e.g. to get the structure currents from.
+        """
+        _eb_id = 'eb'+eb_id_suffix
+        self.add_executionblock(_eb_id, eb, reset=True)
+        if save_necfile:
+            self.as_neccards().save_necfile(self.name+eb_id_suffix)
+        try:
+            for frq in eb.freqsteps.aslist():
+                _xb = ExecutionBlock(FreqSteps('lin', 1, frq), eb.exciteports,
+                                     eb.radpat, eb.ext_thinwire)
+                self.add_executionblock(_eb_id, _xb, reset=True)
+                with _phase(stats, 'deck'):
+                    _deck = self.as_neccards()
+                for nec_context in _deck.exec_pynec(stats=stats):
+                    pass
+                with _phase(stats, 'patterns'):
+                    necout_f = self._read_necout(nec_context, [frq])
+                yield necout_f, nec_context
+        finally:
+            self.add_executionblock(_eb_id, eb, reset=True)
+
+    def _necout_only(self, eb):
+        # PyNEC contexts can't be pickled so only return NECout from workers
+        necout, _ = self.get_necout(eb)
+        return necout
+
+    def _get_necout_ctxcached(self, eb, context_cache):
+        """\
+        Run get_necout() per frequency of `eb` reusing cached solved contexts
+        """
+        necouts = []
+        for frq in eb.freqsteps.aslist():
+            _xb = ExecutionBlock(FreqSteps('lin', 1, frq), eb.exciteports,
+                                 eb.radpat, eb.ext_thinwire)
+            self.add_executionblock('eb', _xb, reset=True)
+            _deck = self.as_neccards()
+            _key = context_cache.key(_deck)
+            nec_context = context_cache.get(_key)
+            radpatnr = None
+            if nec_context is None:
+                for nec_context in _deck.exec_pynec():
+                    pass
+                context_cache.put(_key, nec_context, 1 if eb.radpat else 0)
+                if eb.radpat:
+                    radpatnr = 0
+            elif eb.radpat:
+                radpatnr = context_cache.exec_radpat(_key, eb.radpat)
+            necouts.append(self._read_necout(nec_context, [frq], [0],
+                                             [radpatnr]))
+        necout = NECout.concat_freqs(necouts)
+        necout.freqs = eb.freqsteps.aslist()
+        return necout, nec_context
+
+    def _get_necout_freqchunked(self, eb, workers, nrfreqchunks=None):
+        """\
+        Run get_necout() on frequency chunks of `eb` on `workers` and merge
+        """
+        if nrfreqchunks is None:
+            nrfreqchunks = (workers if isinstance(workers, int)
+                            else os.cpu_count())
+        _xbs = [ExecutionBlock(_fs, eb.exciteports, eb.radpat, eb.ext_thinwire)
+                for _fs in eb.freqsteps.split(nrfreqchunks)]
+        necouts = list(_map_workers(self._necout_only, workers, _xbs))
+        necout = NECout.concat_freqs(necouts)
+        # Report frequencies as for the unchunked sweep
+        necout.freqs = eb.freqsteps.aslist()
+        return necout, None
+
     def calc_eep_SC(self, eb, ref_port_nr=0, save_necfile=False):
             necout, _ = self.get_necout(eb, save_necfile)
             # Use impedance of excited reference port number ref_port_nr
@@ -1410,7 +2952,130 @@ class StructureModel:
         return '\n'.join(out)
 
 
+@dataclass
+class _ArraySymmetry:
+    """\
+    Isometry x -> rot @ x + transl that maps an array onto itself
+
+    `rot` is a rotation by `angle` degrees about the z-axis after an
+    optional mirroring in y (`mirror_y`) and in z (`mirror_z`). Element
+    `antnr` is mapped onto element `perm[antnr]`, and the excited port
+    onto itself with orientation `sign`.
+    """
+    angle: float
+    mirror_y: bool
+    mirror_z: bool
+    rot: np.ndarray
+    transl: np.ndarray
+    perm: np.ndarray
+    sign: int = 1
+
+
+def _symmetry_rot(angle, mirror_y=False, mirror_z=False):
+    # Rotation matrix Rz(angle) @ My^mirror_y @ Mz^mirror_z, angle in degrees
+    _ang = np.deg2rad(angle)
+    rot = np.array([[np.cos(_ang), -np.sin(_ang), 0.],
+                    [np.sin(_ang), np.cos(_ang), 0.],
+                    [0., 0., 1.]])
+    return rot @ np.diag([1., -1. if mirror_y else 1., -1. if mirror_z else 1.])
+
+
+def _wires_image(wires, rot, transl, tol):
+    """\
+    Map wires onto their images under x -> rot @ x + transl
+
+    Returns a list with, for each wire, the index of the wire that is its
+    image and the relative orientation (+1 or -1) of the two, or `None` if
+    the image of some wire is not one of the `wires`.
+    """
+    ends = np.array([[_w.point_src, _w.point_dst] for _w in wires], float)
+    images = ends @ rot.T + transl
+    mapping = []
+    for _w, _img in zip(wires, images):
+        for wnr, _w2 in enumerate(wires):
+            if _w2.radius != _w.radius or _w2.nr_seg != _w.nr_seg: continue
+            if np.all(np.abs(_img - ends[wnr]) < tol):
+                mapping.append((wnr, 1))
+                break
+            if np.all(np.abs(_img[::-1] - ends[wnr]) < tol):
+                mapping.append((wnr, -1))
+                break
+        else:
+            return None
+    return mapping
+
+
+def _symmetry_grid_map(symmetry, thetas, phis, tol=1e-6):
+    """\
+    Index maps of pattern grid directions to their preimages under symmetry
+
+    Returns theta and phi index arrays, such that the direction with indices
+    (thtnr, phinr) is the image of the direction (thtnr_idx[thtnr],
+    phinr_idx[phinr]), or `None` if the grid isn't mapped onto itself.
+    """
+    thetas = np.asarray(thetas, float)
+    phis = np.asarray(phis, float)
+    thetas_0 = 180. - thetas if symmetry.mirror_z else thetas
+    phis_0 = phis - symmetry.angle
+    if symmetry.mirror_y:
+        phis_0 = -phis_0
+    dthts = np.abs(thetas_0[:, None] - thetas[None, :])
+    dphis = np.abs((phis_0[:, None] - phis[None, :] + 180.) % 360. - 180.)
+    if (np.any(np.min(dthts, axis=1) > tol)
+            or np.any(np.min(dphis, axis=1) > tol)):
+        return None
+    return np.argmin(dthts, axis=1), np.argmin(dphis, axis=1)
+
+
+def _symmetry_transform_antspat(symmetry, antspat, freqs, thetas, phis):
+    """\
+    Pattern of the image, under `symmetry`, of the element with `antspat`
+
+    The image's currents are those of the element rotated, translated and
+    multiplied by the port orientation sign, so its far-field is
+    sign*exp(jk.transl)*rot@E(rot^T khat).
+
+    Parameters
+    ----------
+    symmetry : _ArraySymmetry
+        The symmetry.
+    antspat : array
+        Pattern of element, with indices [freq, theta, phi, pol].
+    freqs : list
+        Frequencies in MHz.
+    thetas, phis : list
+        Pattern grid directions in degrees.
+    """
+    thtnr_idx, phinr_idx = _symmetry_grid_map(symmetry, thetas, phis)
+
+    def _basis(thts, phs):
+        thts, phs = np.meshgrid(np.deg2rad(thts), np.deg2rad(phs),
+                                indexing='ij')
+        tht_hat = np.stack([np.cos(thts)*np.cos(phs), np.cos(thts)*np.sin(phs),
+                            -np.sin(thts)], axis=-1)
+        phi_hat = np.stack([-np.sin(phs), np.cos(phs), np.zeros_like(phs)],
+                           axis=-1)
+        khat = np.stack([np.sin(thts)*np.cos(phs), np.sin(thts)*np.sin(phs),
+                         np.cos(thts)], axis=-1)
+        return np.stack([tht_hat, phi_hat], axis=-2), khat  # [th, ph, pol, xyz]
+
+    basis, khat = _basis(thetas, phis)
+    basis_0, _ = _basis(np.asarray(thetas)[thtnr_idx],
+                        np.asarray(phis)[phinr_idx])
+    # Components on image basis of rotated preimage basis vectors
+    pol_mat = np.einsum('tpix,xy,tpjy->tpij', basis, symmetry.rot, basis_0)
+    # Use NEC's speed of light so that phases match its patterns exactly
+    k = 2*np.pi*np.asarray(freqs)*1e6/C0_NEC
+    phase = np.exp(1j*k[:, None, None] * (khat @ symmetry.transl))
+    antspat_0 = antspat[:, thtnr_idx][:, :, phinr_idx]
+    return (symmetry.sign * phase[..., None]
+            * np.einsum('tpij,ftpj->ftpi', pol_mat, antspat_0))
+
+
 class ArrayModel(StructureModel):
+    _khat_cache = None  # Direction cosines per RadPatternSpec
+    _pos_cache = None  # (arr_delta_pos key, positions array)
+    _KHAT_CACHE_SIZE = 8
 
     def __init__(self, name='Model_'):
         super().__init__(name)
@@ -1491,6 +3156,12 @@ class ArrayModel(StructureModel):
         super()._create_geom_groups(d, subgroup_ids)
         self.create_array(d)
 
+    def _geometry_key(self, exclude_groups):
+        # The array chain of GM cards depends on the layout and element tags
+        return (super()._geometry_key(exclude_groups),
+                tuple(tuple(_d) for _d in self.arr_delta_pos),
+                tuple(self.elements_tags[0]))
+
     def _create_excite_exclusive_groups(self, d, _exciteports,
                                         exciteports_grp):
         # Check to see if non element groups are being excited
@@ -1535,7 +3206,151 @@ class ArrayModel(StructureModel):
     def as_neccards(self):
         return super().as_neccards(exclude_groups=self.element)
 
-    def excite_1by1(self, eep_eb, save_necfile=False, print_prog=False):
+    def _port_admittances(self, nec_context, resnr, exciteport_name, sc,
+                          nr_ports=None):
+        """\
+        Admittances from all element ports to the excited port
+
+        Reads the structure currents of result number `resnr` in `nec_context`
+        and returns the currents on the port `exciteport_name` of every
+        element, or of the first `nr_ports` elements, normalized by the port's
+        source voltage. The segment tags and numbers are the same for all
+        results of a structure, so they are only read into `sc` the first
+        time.
+        """
+        # Get structure currents
+        _sc_f = nec_context.get_structure_currents(resnr)
+        sc.set_currents(_sc_f.get_current())
+        if len(sc._segnums) == 0:
+            sc.set_segtags(_sc_f.get_current_segment_tag())
+            sc.set_segnums(_sc_f.get_current_segment_number())
+
+        # Find mutual-impedances
+        gid = self._port_group(exciteport_name)
+        port = self.groups[gid].get_ports(exciteport_name)
+        elemgrpidx = self.element.index(gid)
+        if nr_ports is None:
+            nr_ports = len(self.arr_delta_pos)
+        ex_tags = [self.elements_tags[_antnr_j][elemgrpidx]
+                   for _antnr_j in range(nr_ports)]
+        ex_seg = None
+        if port.source:
+            ex_seg = port.ex_seg
+        cur_ports = sc.get_currents(ex_tags, ex_seg)
+        return cur_ports / port.source.value
+
+    def array_symmetries(self, exciteport_name, radpat=None, tol=1e-9):
+        """\
+        Find the symmetries of the array
+
+        Looks for isometries about the centroid of the array positions, made
+        of rotations about the vertical axis and mirrorings in vertical and
+        horizontal planes, that map the element positions onto each other,
+        the element geometry and its port `exciteport_name` onto themselves,
+        and the non-element geometry onto itself. The ground, if any, only
+        allows symmetries that keep the vertical axis. If `radpat` is given,
+        only symmetries that map its grid of directions onto itself are kept.
+
+        Parameters
+        ----------
+        exciteport_name : str
+            Name of the element port that is excited.
+        radpat : RadPatternSpec
+            Radiation pattern spec whose directions should be mapped.
+        tol : float
+            Relative tolerance for positions to match.
+
+        Returns
+        -------
+        symmetries : list of _ArraySymmetry
+            The symmetries found. The first one is the identity.
+        """
+        pos = np.array(self.arr_delta2arr_pos(self.arr_delta_pos), float)
+        centroid = pos.mean(axis=0)
+        elem_wires = [self.groups[_gid].parts[_pid] for _gid in self.element
+                      for _pid in self.groups[_gid]]
+        nonelem_wires = [self.groups[_gid].parts[_pid]
+                         for _gid in set(self.groups)-set(self.element)
+                         for _pid in self.groups[_gid]]
+        _coords = [pos] + [np.array([_w.point_src, _w.point_dst])
+                           for _w in elem_wires + nonelem_wires]
+        tol = tol*max(1., np.max(np.abs(np.concatenate(_coords))))
+        port_gid = self._port_group(exciteport_name)
+        port = self.groups[port_gid].get_ports(exciteport_name)
+        port_wire = self.groups[port_gid].parts[
+            self.groups[port_gid]._port_part(exciteport_name)]
+        port_wnr = next(_nr for _nr, _w in enumerate(elem_wires)
+                        if _w is port_wire)
+        port_seg = port_wire.parametric_seg(port.fractional_position)
+        thetas, phis = (radpat.as_thetaphis() if radpat is not None
+                        else (None, None))
+        # Candidate angles are those that rotate the element furthest from the
+        # vertical axis onto another, or mirror it onto another, and some
+        # regular polygon angles for arrays on the axis.
+        hpos = pos[:, :2] - centroid[:2]
+        radii = np.hypot(hpos[:, 0], hpos[:, 1])
+        angs = np.rad2deg(np.arctan2(hpos[:, 1], hpos[:, 0]))
+        ref = np.argmax(radii)
+        cand_angs = {(False, round(360.*_m/_n % 360., 9))
+                     for _n in range(1, 13) for _m in range(_n)}
+        cand_angs |= {(True, _a) for _, _a in cand_angs}
+        if radii[ref] > tol:
+            for _j in np.nonzero(np.abs(radii - radii[ref]) < tol)[0]:
+                cand_angs.add((False, round((angs[_j]-angs[ref]) % 360., 9)))
+                cand_angs.add((True, round((angs[_j]+angs[ref]) % 360., 9)))
+        mirror_zs = (False,) if self.ground else (False, True)
+        symmetries = []
+        for mirror_y, angle in sorted(cand_angs):
+            for mirror_z in mirror_zs:
+                rot = _symmetry_rot(angle, mirror_y, mirror_z)
+                transl = centroid - rot @ centroid
+                dists = np.max(np.abs((pos @ rot.T + transl)[:, None]
+                                      - pos[None]), axis=-1)
+                perm = np.argmin(dists, axis=1)
+                if (np.any(dists[np.arange(len(pos)), perm] > tol)
+                        or len(set(perm)) != len(pos)):
+                    continue
+                if nonelem_wires and _wires_image(nonelem_wires, rot, transl,
+                                                  tol) is None:
+                    continue
+                elem_map = _wires_image(elem_wires, rot, np.zeros(3), tol)
+                if elem_map is None or elem_map[port_wnr][0] != port_wnr:
+                    continue
+                sign = elem_map[port_wnr][1]
+                if sign == -1 and port_wire.nr_seg+1-port_seg != port_seg:
+                    continue
+                symmetry = _ArraySymmetry(angle, mirror_y, mirror_z, rot,
+                                          transl, perm, sign)
+                if (radpat is not None and _symmetry_grid_map(
+                        symmetry, thetas, phis) is None):
+                    continue
+                symmetries.append(symmetry)
+        return symmetries
+
+    def _symmetry_orbits(self, exciteport_name, radpat=None):
+        """\
+        Representative element and symmetry mapping it onto each element
+
+        Returns a list with, for each element, the nr of the element that
+        represents its orbit under the array symmetries and the symmetry that
+        maps the representative onto it (`None` for representatives).
+        """
+        nr_ants = len(self.arr_delta_pos)
+        symmetries = self.array_symmetries(exciteport_name, radpat)
+        orbits = [None]*nr_ants
+        for antnr in range(nr_ants):
+            if orbits[antnr] is not None: continue
+            orbits[antnr] = (antnr, None)
+            for symmetry in symmetries:
+                _img = symmetry.perm[antnr]
+                if orbits[_img] is None:
+                    orbits[_img] = (antnr, symmetry)
+        return orbits
+
+    def excite_1by1(self, eep_eb, save_necfile=False, print_prog=False,
+                    factor_once=False, workers=None, cache=None,
+                    capture_currents=None, progress=None, stats=None,
+                    symmetry=False, reciprocity=False, dtype=None):
         """\
         Excite elements one at a time to obtain embedded element properties
 
@@ -1555,60 +3370,424 @@ class ArrayModel(StructureModel):
         print_prog : bool
             Print progress by printing to screen the embedded element being
             excited.
+        factor_once : bool
+            If True, the interaction matrix is filled and factored only once
+            per frequency and then reused for all the element excitations,
+            rather than solving the whole structure anew for each element.
+            Results are the same as when False (default).
+        workers : int or concurrent.futures.Executor
+            Run the element excitations in parallel, either in a process pool
+            with this many worker processes or on the given executor.
+            Results are gathered in antenna order and are identical to the
+            serial run, which is the default (`None`).
+        cache : NECcache
+            Cache for the results of the element excitations, so that
+            elements that have been excited before aren't run again.
+            Default `None` means no cache.
+        capture_currents : dtype
+            Keep the currents on all segments, for all excitations and
+            frequencies, in an array of this dtype (e.g. complex or
+            np.complex64). They are returned as the StructureCurrents object
+            `structure_currents` of the results. Default `None` doesn't
+            keep them.
+        progress : callable
+            Function that is called with a ProgressEvent, with the nr of
+            excitations done, the total and the ETA, after each excitation.
+        stats : RunStats
+            Record the time spent in each phase in this. A new RunStats is
+            made if `None` (default). It is set as `stats` of the results.
+        symmetry : bool
+            If True, only one element per orbit of the array's symmetries
+            (see array_symmetries()) is excited, and the EEPs and admittances
+            of the other elements are obtained by rotating, mirroring and
+            phase shifting those of their representative. Can't be used with
+            `factor_once` or `capture_currents`.
+        reciprocity : bool
+            If True, only the upper triangle of the admittance matrix is
+            harvested, i.e. exciting an element only the ports of it and of
+            the elements before it are read, and the lower triangle is filled
+            using reciprocity (Y = Y^T). The result is then exactly symmetric,
+            so its reciprocity_residual() is zero. Can't be used with
+            `symmetry`.
+        dtype : dtype
+            Complex dtype of the patterns, e.g. np.complex64 to halve their
+            memory, see EEPdata.astype(). Default `None` keeps NEC's double
+            precision. The admittances are always in double precision.
         
         Returns
         -------
         results : EEPdata
             The EEP data, or specifically a EEP_SC() object.
         """
-        _frq_cntr_step = eep_eb.freqsteps
-        freqs = _frq_cntr_step.aslist()
+        if factor_once:
+            if workers is not None:
+                raise ValueError('factor_once cannot be combined with workers')
+            if symmetry:
+                raise ValueError('factor_once cannot be combined with symmetry')
+            return self._excite_1by1_factor_once(eep_eb, save_necfile,
+                                                 print_prog, cache,
+                                                 capture_currents, progress,
+                                                 stats, reciprocity, dtype)
+        if symmetry and reciprocity:
+            raise ValueError('reciprocity cannot be combined with symmetry')
+        if stats is None:
+            stats = RunStats()
+        freqs = eep_eb.freqsteps.aslist()
         _exciteport_name, _vltsrc = eep_eb.exciteports
-        _rad_pat = eep_eb.radpat
         nr_ants = len(self.arr_delta_pos)
         _eep_sc = []
         _admittances = np.zeros((len(freqs), nr_ants, nr_ants), complex)
-        sc = StructureCurrents(freqs, nr_ants)
-        for antnr in range(nr_ants):
+        sc = None
+        if capture_currents is not None:
+            if symmetry:
+                raise ValueError(
+                    'capture_currents cannot be combined with symmetry')
+            sc = StructureCurrents(freqs, nr_ants, capture_currents)
+        if symmetry:
+            orbits = self._symmetry_orbits(_exciteport_name, eep_eb.radpat)
+        else:
+            orbits = [(antnr, None) for antnr in range(nr_ants)]
+        rep_antnrs = [antnr for antnr, (_rep, _) in enumerate(orbits)
+                      if _rep == antnr]
+        _eep_sc = [None]*nr_ants
+        _excitations = _map_workers(self._excite_element, workers,
+                                    rep_antnrs, itertools.repeat(eep_eb),
+                                    itertools.repeat(save_necfile),
+                                    itertools.repeat(cache),
+                                    itertools.repeat(capture_currents),
+                                    itertools.repeat(reciprocity))
+        _progress = _Progress('excite_1by1', len(rep_antnrs), progress)
+        antspats = None
+        for _nr, (antnr, (_necout, _adm_cols, _sc, _stats)) in enumerate(
+                zip(rep_antnrs, _excitations)):
             if print_prog:
                 print(f'Exciting antenna {antnr}/{nr_ants}', end='\r',
                       flush=True)
-            _prt_exc = ((antnr, _exciteport_name), _vltsrc)
-            _xb = ExecutionBlock(_frq_cntr_step, [_prt_exc], _rad_pat,
-                                 ext_thinwire=eep_eb.ext_thinwire)
-            _necout, nec_context = super().get_necout(_xb, save_necfile,
-                                                      eb_id_suffix=str(antnr))
-            _eep_sc.append(_necout)
-            for f in range(len(freqs)):
-                # Get structure currents
-                _sc_f = nec_context.get_structure_currents(f)
-                _currents = _sc_f.get_current()
-                _sc_segtags = _sc_f.get_current_segment_tag()
-                _sc_segnums = _sc_f.get_current_segment_number()
-                sc.currents = _currents
-                sc.set_segtags(_sc_segtags)
-                sc.set_segnums(_sc_segnums)
-
-                # Find mutual-impedances
-                admittances_T = []
-                gid = self._port_group(_exciteport_name)
-                port = self.groups[gid].get_ports(_exciteport_name)
-                elemgrpidx = self.element.index(gid)
-                for _antnr_j in range(nr_ants):
-                    ex_tag = self.elements_tags[_antnr_j][elemgrpidx]
-                    ex_seg = None
-                    if port.source:
-                        ex_seg = port.ex_seg
-                    cur_port = sc.get_current(ex_tag, ex_seg)
-                    admittances_T.append(cur_port / port.source.value)
-                _admittances[f,:,antnr] = np.array(admittances_T)
+            stats.merge(_stats)
+            with stats.phase('postproc'):
+                _eep_sc[antnr] = _necout
+                antspats = EEPdata._put_antspat(antspats, antnr, _necout,
+                                                nr_ants, dtype)
+                _admittances[:, :, antnr] = _adm_cols
+                if sc is not None:
+                    if _nr == 0:
+                        sc.set_segtags(_sc.get_segtags())
+                        sc.set_segnums(_sc.get_segnums())
+                    sc.capture(antnr, currents=_sc.currents_arr[0])
+            _progress.step(_nr+1)
+        print() if print_prog else None
+        with stats.phase('postproc'):
+            if symmetry:
+                self._apply_symmetries(orbits, eep_eb, _eep_sc, antspats,
+                                       _admittances)
+            if reciprocity:
+                _fill_lower_from_upper(_admittances)
+            results = EEP_SC(_eep_sc, _admittances, _vltsrc.value,
+                             structure_currents=sc)
+            if antspats is not None:
+                results.set_antspat_arr(antspats)
+        results.stats = stats
+        return results
+
+    def excite_1by1_adaptive(self, eep_eb, tol=1e-3, nr_init=5,
+                             max_solves=None, **kwargs):
+        """\
+        Excite elements one at a time at adaptively chosen frequencies
+
+        Rather than solving at every frequency of `eep_eb`, starts from
+        `nr_init` frequencies spread over the band and fits rational models,
+        see _aaa_fit(), to the admittances and EEPs. Frequencies are added
+        where two models of consecutive orders differ most, until they
+        agree to within `tol` over the band. The results at the frequencies
+        not solved are then evaluated from the model.
+
+        Parameters
+        ----------
+        eep_eb : ExecutionBlock
+            As for excite_1by1(). Its frequency steps are the frequencies
+            where the results are wanted.
+        tol : float
+            Tolerance of the model relative to the largest admittances and
+            EEPs, which are each normalized to 1.
+        nr_init : int
+            Nr of frequencies to solve initially.
+        max_solves : int
+            Maximum nr of frequencies to solve. Default `None` means no limit.
+        kwargs
+            Passed on to excite_1by1() for each solved frequency.
+
+        Returns
+        -------
+        results : EEP_SC
+            The EEP data for all the frequencies of `eep_eb`. The frequencies
+            that were solved are in its `solved_freqs`.
+        """
+        freqs = np.array(eep_eb.freqsteps.aslist())
+        nr_freqs = len(freqs)
+        if max_solves is None:
+            max_solves = nr_freqs
+        stats = kwargs.pop('stats', None) or RunStats()
+        solved = {}
+
+        def _solve(frqnr):
+            _xb = ExecutionBlock(FreqSteps('lin', 1, freqs[frqnr]),
+                                 eep_eb.exciteports, eep_eb.radpat,
+                                 eep_eb.ext_thinwire)
+            solved[frqnr] = self.excite_1by1(_xb, stats=stats, **kwargs)
+
+        # The EEPs are modelled without the phase of their element positions,
+        # which would otherwise need many poles for large arrays.
+        if eep_eb.radpat is not None:
+            pos = np.array(self.arr_delta2arr_pos(self.arr_delta_pos))
+            k = 2*np.pi*freqs*1e6/C0_NEC
+            pos_phase = np.exp(1j*k[:, None, None, None]
+                               * (eep_eb.radpat.as_khat() @ pos.T))
+            pos_phase = np.moveaxis(pos_phase, -1, 0)[..., None]
+        for frqnr in np.unique(np.round(np.linspace(
+                0, nr_freqs-1, min(nr_init, nr_freqs, max_solves)))):
+            _solve(int(frqnr))
+        while True:
+            frqnrs = sorted(solved)
+            adm = np.concatenate([solved[_f].admittances for _f in frqnrs])
+            antspats = np.concatenate(
+                [solved[_f].get_antspats_arr() for _f in frqnrs], axis=1)
+            if antspats.size:
+                antspats = antspats / pos_phase[:, frqnrs]
+            antspats = np.moveaxis(antspats, 1, 0)  # Freq first
+            # Normalized data, reduced to its (at most nr solved) principal
+            # components, which span the same Loewner least squares problem
+            _data = [adm.reshape((len(frqnrs), -1))]
+            _data[0] = _data[0]/np.abs(_data[0]).max()
+            if antspats.size:
+                _data.append(antspats.reshape((len(frqnrs), -1))
+                             / np.abs(antspats).max())
+            _u, _s, _ = np.linalg.svd(np.concatenate(_data, axis=1),
+                                      full_matrices=False)
+            data = _u * _s
+            z = freqs[frqnrs]
+            nr_sup = len(frqnrs)//2 + 1
+            sup, wghts = _aaa_fit(z, data, nr_sup)
+            if len(frqnrs) >= min(max_solves, nr_freqs):
+                break
+            sup_b, wghts_b = _aaa_fit(z, data, max(nr_sup-1, 1))
+            err = np.linalg.norm(_bary_eval(freqs, z[sup], data[sup], wghts)
+                                 - _bary_eval(freqs, z[sup_b], data[sup_b],
+                                              wghts_b), axis=1)
+            err = err / np.linalg.norm(data, axis=1).max()
+            err[frqnrs] = 0.
+            if err.max() < tol:
+                break
+            _solve(int(np.argmax(err)))
+        with stats.phase('postproc'):
+            adm_all = _bary_eval(freqs, z[sup], adm[sup], wghts)
+            antspats_all = _bary_eval(freqs, z[sup], antspats[sup], wghts)
+            # Use the solved results where there are any
+            adm_all[frqnrs] = adm
+            antspats_all[frqnrs] = antspats
+            antspats_all = np.moveaxis(antspats_all, 0, 1)
+            if antspats_all.size:
+                antspats_all *= pos_phase
+            _vltsrc = eep_eb.exciteports[1]
+            _eep0 = solved[frqnrs[0]].eeps
+            eeps = []
+            for antnr in range(len(_eep0)):
+                _inp_I = _vltsrc.value*adm_all[:, antnr, antnr, None]
+                eeps.append(NECout(freqs.tolist(), _eep0[antnr].thetas,
+                                   _eep0[antnr].phis, None, None,
+                                   inp_V=np.full_like(_inp_I, _vltsrc.value),
+                                   inp_I=_inp_I,
+                                   inp_Z=_vltsrc.value/_inp_I))
+            results = EEP_SC(eeps, adm_all, _vltsrc.value)
+            results.set_antspat_arr(antspats_all)
+        results.stats = stats
+        results.solved_freqs = freqs[frqnrs].tolist()
+        return results
+
+    @staticmethod
+    def _apply_symmetries(orbits, eep_eb, eeps, antspats, admittances):
+        """\
+        Fill in EEPs and admittances of elements from their representatives
+
+        `orbits` is as returned by _symmetry_orbits(). The NECouts in `eeps`,
+        the patterns in `antspats` and the admittance columns of the
+        non-representative elements are set in place. Exciting the image of
+        an element under a symmetry gives the image of its currents, times
+        the port orientation sign, so the port currents on the image
+        elements, i.e. the admittances, are the same.
+        """
+        freqs = eep_eb.freqsteps.aslist()
+        thetas, phis = (eep_eb.radpat.as_thetaphis() if eep_eb.radpat
+                        else (None, None))
+        for antnr, (_rep, symmetry) in enumerate(orbits):
+            if symmetry is None: continue
+            _necout = eeps[_rep]
+            eeps[antnr] = replace(_necout, inp_V=copy(_necout.inp_V),
+                                  inp_I=copy(_necout.inp_I),
+                                  inp_Z=copy(_necout.inp_Z))
+            admittances[:, symmetry.perm, antnr] = admittances[:, :, _rep]
+            if antspats is not None:
+                antspats[antnr] = _symmetry_transform_antspat(
+                    symmetry, antspats[_rep], freqs, thetas, phis)
+
+    def _excite_element(self, antnr, eep_eb, save_necfile=False, cache=None,
+                        capture_currents=None, reciprocity=False):
+        """\
+        Excite element `antnr` and return its NECout and admittance columns
+
+        The admittance columns have shape (nfrq, nant), and only the rows up
+        to `antnr` are set if `reciprocity` is True. Also returned are the
+        element's StructureCurrents, if `capture_currents` is not `None`, and
+        the RunStats of the run. This is the unit of work in excite_1by1(),
+        so it may run in a worker process on a copy of this model.
+        """
+        stats = RunStats()
+        freqs = eep_eb.freqsteps.aslist()
+        _exciteport_name, _vltsrc = eep_eb.exciteports
+        nr_ants = len(self.arr_delta_pos)
+        sc = StructureCurrents(freqs, nr_ants, capture_currents,
+                               nr_excitations=1)
+        _prt_exc = ((antnr, _exciteport_name), _vltsrc)
+        _xb = ExecutionBlock(eep_eb.freqsteps, [_prt_exc], eep_eb.radpat,
+                             ext_thinwire=eep_eb.ext_thinwire)
+        if cache is not None:
+            self.add_executionblock('eb'+str(antnr), _xb, reset=True)
+            with stats.phase('deck'):
+                _deck = self.as_neccards()
+            if save_necfile:
+                _deck.save_necfile(self.name+str(antnr))
+                save_necfile = False
+            _key = cache.key(_deck, 'excite_element'
+                             + ('' if capture_currents is None
+                                else f'_currents_{np.dtype(capture_currents)}')
+                             + ('_upper' if reciprocity else ''))
+            result = cache.get(_key)
+            if result is not None:
+                return result + (stats,)
+        _adm_cols = np.zeros((len(freqs), nr_ants), complex)
+        _necout = None
+        for f, (_necout_f, nec_context) in enumerate(super().iter_necout(
+                _xb, save_necfile, eb_id_suffix=str(antnr), stats=stats)):
+            with stats.phase('postproc'):
+                if _necout is None:
+                    _necout = NECout.alloc_freqs(_necout_f, freqs)
+                _necout.set_freq(f, _necout_f)
+            with stats.phase('currents'):
+                _nr_ports = antnr+1 if reciprocity else nr_ants
+                _adm_cols[f, :_nr_ports] = self._port_admittances(
+                    nec_context, 0, _exciteport_name, sc, _nr_ports)
+                sc.capture(0, f)
+        if capture_currents is None:
+            sc = None
+        if cache is not None:
+            cache.put(_key, (_necout, _adm_cols, sc))
+        return _necout, _adm_cols, sc, stats
+
+    def _excite_1by1_factor_once(self, eep_eb, save_necfile=False,
+                                 print_prog=False, cache=None,
+                                 capture_currents=None, progress=None,
+                                 stats=None, reciprocity=False, dtype=None):
+        """\
+        Excite elements one at a time reusing the factored matrix
+
+        Builds a single deck that, for each frequency, sets the frequency once
+        and then has one EX & RP (or XQ) pair per element. NEC only fills and
+        factors the interaction matrix at the first execution after the FR
+        card, so the following element excitations just solve for the new
+        right-hand side. Results are stored in the PyNEC context in the order
+        (freq, antenna).
+        """
+        if stats is None:
+            stats = RunStats()
+        freqs = eep_eb.freqsteps.aslist()
+        _exciteport_name, _vltsrc = eep_eb.exciteports
+        _rad_pat = eep_eb.radpat
+        nr_ants = len(self.arr_delta_pos)
+        self.executionblocks = {}
+        for frqnr, frq in enumerate(freqs):
+            _fs = FreqSteps('lin', 1, frq)
+            for antnr in range(nr_ants):
+                _prt_exc = ((antnr, _exciteport_name), _vltsrc)
+                # Only first element block sets up frequency and environment
+                _frstblk = antnr == 0
+                _xb = ExecutionBlock(_fs if _frstblk else None, [_prt_exc],
+                                     _rad_pat, ext_thinwire=(
+                                         eep_eb.ext_thinwire and _frstblk))
+                self.add_executionblock(f'eb{frqnr}_{antnr}', _xb)
+        with stats.phase('deck'):
+            _deck = self.as_neccards()
+        if save_necfile:
+            _deck.save_necfile(self.name)
+        if cache is not None:
+            _key = cache.key(_deck, 'excite_1by1'
+                             + ('' if capture_currents is None
+                                else f'_currents_{np.dtype(capture_currents)}')
+                             + ('_upper' if reciprocity else ''))
+            result = cache.get(_key)
+            if result is not None:
+                _eep_sc, _admittances, sc = result
+                with stats.phase('postproc'):
+                    antspats = None
+                    for antnr, _necout in enumerate(_eep_sc):
+                        antspats = EEPdata._put_antspat(antspats, antnr,
+                                                        _necout, nr_ants,
+                                                        dtype)
+                    results = EEP_SC(_eep_sc, _admittances, _vltsrc.value,
+                                     structure_currents=sc)
+                    if antspats is not None:
+                        results.set_antspat_arr(antspats)
+                results.stats = stats
+                return results
+        _admittances = np.zeros((len(freqs), nr_ants, nr_ants), complex)
+        sc = StructureCurrents(freqs, nr_ants, capture_currents)
+        nr_blcks = len(freqs)*nr_ants
+        _progress = _Progress('excite_1by1', nr_blcks, progress)
+        for blcknr, nec_context in enumerate(_deck.exec_pynec(stats=stats)):
+            if print_prog:
+                print(f'Exciting antenna {blcknr % nr_ants}/{nr_ants} '
+                      f'freq {blcknr // nr_ants}/{len(freqs)}', end='\r',
+                      flush=True)
+            _progress.step(blcknr+1)
         print() if print_prog else None
-        results = EEP_SC(_eep_sc, _admittances, _vltsrc.value)
+        _eep_sc = []
+        antspats = None
+        for antnr in range(nr_ants):
+            resnrs = range(antnr, nr_blcks, nr_ants)
+            with stats.phase('patterns'):
+                _eep_sc.append(self._read_necout(nec_context, freqs, resnrs))
+            with stats.phase('postproc'):
+                antspats = EEPdata._put_antspat(antspats, antnr, _eep_sc[-1],
+                                                nr_ants, dtype)
+            with stats.phase('currents'):
+                _nr_ports = antnr+1 if reciprocity else nr_ants
+                for f, resnr in enumerate(resnrs):
+                    _admittances[f, :_nr_ports, antnr] = \
+                        self._port_admittances(nec_context, resnr,
+                                               _exciteport_name, sc, _nr_ports)
+                    sc.capture(antnr, f)
+        if reciprocity:
+            _fill_lower_from_upper(_admittances)
+        if capture_currents is None:
+            sc = None
+        if cache is not None:
+            cache.put(_key, (_eep_sc, _admittances, sc))
+        with stats.phase('postproc'):
+            results = EEP_SC(_eep_sc, _admittances, _vltsrc.value,
+                             structure_currents=sc)
+            if antspats is not None:
+                results.set_antspat_arr(antspats)
+        results.stats = stats
         return results
 
-    def calc_steering_vector(self, eep_eb):
+    def calc_steering_vector(self, eep_eb, dtype=complex):
         """Calculate steering vector for array
 
+        Parameters
+        ----------
+        eep_eb : ExecutionBlock
+            Execution block whose frequencies and directions are used.
+        dtype : dtype
+            Complex dtype of the output, np.complex64 halves its size.
+
         Returns
         -------
         steering_vectors : (nant, nfr, nth, nph) shaped array
@@ -1616,15 +3795,283 @@ class ArrayModel(StructureModel):
             for wavevector k_i (given by direction cosines times wavenumber)
             and the position vector r_l for all antennas a.
         """
-        khat = eep_eb.radpat.as_khat()
-        pos = self.arr_delta2arr_pos(self.arr_delta_pos)
-        pos = np.array(pos)  # pos.shape = (nant, xyz)
-        phases_hat = np.matmul(khat, pos.T)  # khat[nth,nph,xyz] pos[nant,xyz]
-                                            # phase_hat.shape = (nth, nph, nant)
-        _freqs = eep_eb.freqsteps.aslist()
-        k = 2*np.pi/3e2*np.array(_freqs)  # k=2pi*freq/c, shape = (nfrq,)
-        phases = k[:, np.newaxis, np.newaxis, np.newaxis] * phases_hat
-        steering_vectors = np.exp(+1j*phases)  # sv[nfrq,nth,nph,nant]
-        steering_vectors = np.moveaxis(steering_vectors, -1, 0)
+        khat = self._cached_khat(eep_eb.radpat)
+        return self._steering_phasors(khat, eep_eb.freqsteps.aslist(), dtype)
+
+    def iter_steering_vectors(self, eep_eb, chunksize=4096, over='directions',
+                              dtype=np.complex64):
+        """\
+        Generate steering vectors in chunks
+
+        Like calc_steering_vector() but only one chunk of directions or
+        frequencies is held in memory at a time, for dense sky grids.
+
+        Parameters
+        ----------
+        eep_eb : ExecutionBlock
+            Execution block whose frequencies and directions are used.
+        chunksize : int
+            Nr of directions, or frequencies, per chunk.
+        over : str
+            'directions' chunks the flattened theta, phi grid, and
+            'frequencies' chunks the frequencies.
+        dtype : dtype
+            Complex dtype of the output.
+
+        Yields
+        ------
+        sl : slice
+            Slice of the flattened directions, or of the frequencies, of
+            the chunk.
+        steering_vectors : array
+            Steering vectors of the chunk, with shape (nant, nfr, sl) if over
+            directions, or (nant, sl, nth, nph) if over frequencies.
+        """
+        khat = self._cached_khat(eep_eb.radpat)
+        freqs = eep_eb.freqsteps.aslist()
+        if over == 'directions':
+            khat = khat.reshape((-1, 3))
+            nr_items = len(khat)
+        elif over == 'frequencies':
+            nr_items = len(freqs)
+        else:
+            raise ValueError("over should be 'directions' or 'frequencies'")
+        for _start in range(0, nr_items, chunksize):
+            sl = slice(_start, min(_start+chunksize, nr_items))
+            if over == 'directions':
+                yield sl, self._steering_phasors(khat[sl], freqs, dtype)
+            else:
+                yield sl, self._steering_phasors(khat, freqs[sl], dtype)
+
+    def _cached_khat(self, radpat):
+        # RadPatternSpec is mutable so its current values are the key
+        if self._khat_cache is None:
+            self._khat_cache = {}
+        key = astuple(radpat)
+        khat = self._khat_cache.get(key)
+        if khat is None:
+            if len(self._khat_cache) >= self._KHAT_CACHE_SIZE:
+                del self._khat_cache[next(iter(self._khat_cache))]
+            khat = radpat.as_khat()
+            khat.flags.writeable = False
+            self._khat_cache[key] = khat
+        return khat
+
+    def _cached_positions(self):
+        # Absolute array positions, shape (nant, xyz), for current layout
+        key = tuple(tuple(_d) for _d in self.arr_delta_pos)
+        if self._pos_cache is None or self._pos_cache[0] != key:
+            pos = np.array(self.arr_delta2arr_pos(self.arr_delta_pos), float)
+            pos.flags.writeable = False
+            self._pos_cache = (key, pos)
+        return self._pos_cache[1]
+
+    def _steering_phasors(self, khat, freqs, dtype=complex):
+        # exp(j*k*khat.r_a) with shape (nant, nfrq) + khat.shape[:-1]
+        pos = self._cached_positions()
+        phases_hat = np.moveaxis(khat @ pos.T, -1, 0)  # [nant, ...]
+        k = 2*np.pi/3e2*np.array(freqs)  # k=2pi*freq/c, shape = (nfrq,)
+        phases = (k.reshape(k.shape + (1,)*(phases_hat.ndim-1))
+                  * phases_hat[:, np.newaxis])
+        if np.dtype(dtype) == np.complex128:
+            return np.exp(+1j*phases)
+        # Reduce the phases while in double precision
+        phases = np.remainder(phases, 2*np.pi).astype(np.finfo(dtype).dtype)
+        steering_vectors = np.empty(phases.shape, dtype)
+        steering_vectors.real = np.cos(phases)
+        steering_vectors.imag = np.sin(phases)
         return steering_vectors
 
+    def steering_weights(self, freqs, thetas, phis, dtype=complex):
+        """\
+        Weights that point beams in given directions
+
+        The weights are the conjugated steering vectors, normalized by the
+        nr of antennas, so that the beam formed with EEPdata.form_beams() of
+        isotropic elements has unit gain in its pointing direction.
+
+        Parameters
+        ----------
+        freqs : list
+            Frequencies in MHz.
+        thetas, phis : array
+            Pointing directions in degrees, one per beam.
+        dtype : dtype
+            Complex dtype of the weights; should be np.complex64 for beams
+            of single precision EEPs.
+
+        Returns
+        -------
+        weights : array
+            Weights with indices [beamnr, freqnr, antnr].
+        """
+        thetas = np.deg2rad(np.ravel(thetas))
+        phis = np.deg2rad(np.ravel(phis))
+        khat = np.stack([np.sin(thetas)*np.cos(phis),
+                         np.sin(thetas)*np.sin(phis), np.cos(thetas)], -1)
+        sv = self._steering_phasors(khat, freqs, dtype)  # sv[nant,nfrq,nbeam]
+        return sv.conj().transpose(2, 1, 0) / sv.shape[0]
+
+
+
+def _excite_1by1_run(model, eep_eb, excite_kwargs):
+    # Module level, rather than a lambda, so it can be sent to processes
+    return model.excite_1by1(eep_eb, **excite_kwargs)
+
+
+class ParameterSweep:
+    """\
+    Sweep of ArrayModel.excite_1by1() over a grid of parameters
+
+    For each point of the grid, `model_factory` is called with the point's
+    parameters as keyword arguments and returns the ArrayModel and the
+    ExecutionBlock to run, so any layout, element, ground or frequency
+    parameter can be swept. Points whose decks are identical are run once.
+
+    Parameters
+    ----------
+    model_factory : callable
+        Function `model_factory(**params)` returning `(model, eep_eb)`.
+    grid : dict
+        Values of each parameter, e.g. {'spacing': [0.5, 1.], 'radius':
+        [1e-3, 1e-2]}. The parameters are the axes of the results, in order.
+    excite_kwargs
+        Keyword arguments passed on to excite_1by1() for every run.
+
+    Attributes
+    ----------
+    axes : dict
+        Parameter names and their values, in the order of the axes.
+    results : array
+        Object array of EEP_SC results with one axis per parameter. Points
+        that haven't been run yet are `None`, so it holds partial results
+        while iter_run() is running.
+    """
+
+    def __init__(self, model_factory, grid, **excite_kwargs):
+        self.model_factory = model_factory
+        self.axes = {_name: list(_vals) for _name, _vals in grid.items()}
+        self.excite_kwargs = excite_kwargs
+        self.results = np.empty([len(_vals) for _vals in self.axes.values()],
+                                object)
+
+    def points(self):
+        """\
+        Yield the index into `results` and the parameters of each point
+        """
+        for idx in np.ndindex(self.results.shape):
+            yield idx, {_name: _vals[_i] for (_name, _vals), _i
+                        in zip(self.axes.items(), idx)}
+
+    @staticmethod
+    def _run_key(model, eep_eb):
+        # Canonical deck exciting the first element; runs with the same deck
+        # give the same results for all elements
+        _exciteport_name, _vltsrc = eep_eb.exciteports
+        model.add_executionblock('eb', ExecutionBlock(
+            eep_eb.freqsteps, [((0, _exciteport_name), _vltsrc)],
+            eep_eb.radpat, eep_eb.ext_thinwire), reset=True)
+        return NECcache.canonical_deck(model.as_neccards())
+
+    def iter_run(self, workers=None, progress=None):
+        """\
+        Run the points of the grid, yielding their results as they complete
+
+        Points that already have results are skipped, so a sweep that was
+        interrupted can be resumed.
+
+        Parameters
+        ----------
+        workers : int or concurrent.futures.Executor
+            Run the points in parallel, either in a process pool with this
+            many worker processes or on the given executor. Default `None`
+            runs them serially.
+        progress : callable
+            Function that is called with a ProgressEvent after each run.
+
+        Yields
+        ------
+        idx : tuple
+            Index of the point into `results`.
+        params : dict
+            Parameters of the point.
+        result : EEP_SC
+            Result of the point, shared with identical points.
+        """
+        runs = {}
+        for idx, params in self.points():
+            if self.results[idx] is not None:
+                continue
+            model, eep_eb = self.model_factory(**params)
+            key = self._run_key(model, eep_eb)
+            runs.setdefault(key, (model, eep_eb, []))[2].append((idx, params))
+        _progress = _Progress('sweep', len(runs), progress)
+        executor = workers
+        if isinstance(workers, int):
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+        futures = {}
+        try:
+            if executor is None:
+                completed = ((_points, _excite_1by1_run(model, eep_eb,
+                                                        self.excite_kwargs))
+                             for model, eep_eb, _points in runs.values())
+            else:
+                futures = {executor.submit(_excite_1by1_run, model, eep_eb,
+                                           self.excite_kwargs): _points
+                           for model, eep_eb, _points in runs.values()}
+                completed = ((futures[_fut], _fut.result()) for _fut
+                             in concurrent.futures.as_completed(futures))
+            for _nr, (_points, result) in enumerate(completed):
+                for idx, params in _points:
+                    self.results[idx] = result
+                _progress.step(_nr+1)
+                for idx, params in _points:
+                    yield idx, params, result
+        finally:
+            # Don't leave pending runs behind if the iteration is abandoned
+            for _fut in futures:
+                _fut.cancel()
+            if executor is not workers:
+                executor.shutdown()
+
+    def run(self, workers=None, progress=None):
+        """\
+        Run all points of the grid, see iter_run(), and return self
+        """
+        for _ in self.iter_run(workers, progress):
+            pass
+        return self
+
+    def stack(self, func, fill=np.nan):
+        """\
+        Stack a quantity of the results along the parameter axes
+
+        Parameters
+        ----------
+        func : callable or str
+            Function of an EEP_SC result returning the quantity, e.g.
+            `lambda r: r.get_antspats_arr()`, or the name of an attribute,
+            e.g. 'admittances'.
+        fill : scalar
+            Value of points that have no result yet.
+
+        Returns
+        -------
+        stacked : array
+            Array with the parameter axes, as in `axes`, followed by the
+            axes of the quantity.
+        """
+        if isinstance(func, str):
+            _attr = func
+            func = lambda _r: getattr(_r, _attr)
+        values = {idx: np.asarray(func(self.results[idx]))
+                  for idx in np.ndindex(self.results.shape)
+                  if self.results[idx] is not None}
+        if not values:
+            raise ValueError('No results to stack yet')
+        _val0 = next(iter(values.values()))
+        stacked = np.full(self.results.shape + _val0.shape, fill,
+                          np.result_type(_val0, fill))
+        for idx, _val in values.items():
+            stacked[idx] = _val
+        return stacked
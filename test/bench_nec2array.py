@@ -0,0 +1,335 @@
+"""\
+Benchmarks of the hot paths of nec2array
+
+Times model building, NEC solving and post-processing at parameterized sizes
+and writes the results to a JSON file, so that runs on different commits can
+be compared. Run e.g.
+
+    python test/bench_nec2array.py --size small --out bench_new.json
+
+and compare to an earlier run with
+
+    python test/bench_nec2array.py --size small --out bench_new.json \\
+        --compare bench_old.json --threshold 0.2
+
+which reports each benchmark's time ratio and exits with status 1 if any
+benchmark is slower than the earlier run by more than the threshold.
+The parameters of the size preset can be overridden, e.g.
+
+    python test/bench_nec2array.py --size medium --nr-elems 32 --nth 10
+
+to scale one dimension of the problem only.
+"""
+import argparse
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import time
+from io import StringIO
+import numpy as np
+
+# Import nec2array from this checkout, also when run as a script
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from nec2array import (ArrayModel, StructureModel, Deck, Wire, VoltageSource,
+                       FreqSteps, ExecutionBlock, RadPatternSpec, impedanceRLC,
+                       NECcache)
+
+# Problem sizes: nr of array elements, min nr of segments per wavelength,
+# nr of frequencies and nr of theta & phi directions.
+SIZES = {
+    'small': dict(nr_elems=4, segs_perlambda=21, nr_freqs=3, nth=19, nph=36),
+    'medium': dict(nr_elems=8, segs_perlambda=41, nr_freqs=5, nth=46, nph=90),
+    'large': dict(nr_elems=16, segs_perlambda=65, nr_freqs=10, nth=91,
+                  nph=180),
+}
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """\
+    Register a benchmark
+
+    The decorated function sets up the problem for a size and returns the
+    function to time. If the function has an `items` attribute, the nr of
+    items it processes per call, their throughput is reported too.
+    """
+    def _register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return _register
+
+
+def dipole_array(nr_elems, segs_perlambda, nr_freqs, nth, nph):
+    """\
+    Create a uniform linear array of half-wave dipoles and its execution block
+    """
+    fs = FreqSteps('lin', nr_freqs, 100., 50./max(nr_freqs-1, 1))  # MHz
+    lamhalf = 3e2/fs.max_freq()/2
+    arr = ArrayModel('bench')
+    arr['dip']['Z'] = Wire((0., 0., -lamhalf/2), (0., 0., lamhalf/2),
+                           1e-5).add_port(0.5, 'VS')
+    arr.segmentalize(segs_perlambda, fs.max_freq())
+    arr.arrayify(element=['dip'],
+                 array_positions=[[0.7*lamhalf*_i, 0., 0.]
+                                  for _i in range(nr_elems)])
+    rps = RadPatternSpec(nth=nth, thets=0., dth=90./max(nth-1, 1),
+                         nph=nph, phis=0., dph=360./nph)
+    eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+    return arr, eb
+
+
+def _element_eb(eb, antnr=0):
+    # Execution block exciting only element `antnr`, as in excite_1by1()
+    return ExecutionBlock(eb.freqsteps, [((antnr, 'VS'), VoltageSource(1.0))],
+                          eb.radpat)
+
+
+def _eeps(size):
+    arr, eb = dipole_array(**size)
+    return arr, eb, arr.excite_1by1(eb)
+
+
+@benchmark('Deck.__str__')
+def bench_deck_str(size):
+    arr, eb = dipole_array(**size)
+    arr.add_executionblock('eb', _element_eb(eb), reset=True)
+    deck = arr.as_neccards()
+    return lambda: str(deck)
+
+
+@benchmark('Deck.write_to')
+def bench_deck_write_to(size):
+    arr, eb = dipole_array(**size)
+    arr.add_executionblock('eb', _element_eb(eb), reset=True)
+    deck = arr.as_neccards()
+    return lambda: deck.write_to(StringIO())
+
+
+@benchmark('Deck.load_necfile')
+def bench_deck_load(size):
+    arr, eb = dipole_array(**size)
+    arr.add_executionblock('eb', _element_eb(eb), reset=True)
+    deckstr = str(arr.as_neccards())
+    return lambda: Deck().load_necfile(StringIO(deckstr))
+
+
+@benchmark('Deck.load_necfile(GW cards)')
+def bench_deck_load_gw(size):
+    # Deck of many GW cards, as imported from other tools
+    nr_cards = 1000*size['nr_elems']*size['nr_freqs']
+    rng = np.random.default_rng(0)
+    deck = Deck([('GW', _i % 999 + 1, 5, *rng.normal(size=6).round(4), 1e-3)
+                 for _i in range(nr_cards)] + [('GE', 0), ('EN',)])
+    deckstr = str(deck)
+
+    def _load():
+        Deck().load_necfile(StringIO(deckstr)).gw_arrays()
+    _load.items = len(deck.carddeck)
+    return _load
+
+
+@benchmark('StructureModel.as_neccards')
+def bench_as_neccards(size):
+    arr, eb = dipole_array(**size)
+    arr.add_executionblock('eb', _element_eb(eb), reset=True)
+    return arr.as_neccards
+
+
+@benchmark('StructureModel.get_necout')
+def bench_get_necout(size):
+    arr, eb = dipole_array(**size)
+    return lambda: StructureModel.get_necout(arr, _element_eb(eb))
+
+
+@benchmark('ArrayModel.excite_1by1')
+def bench_excite_1by1(size):
+    arr, eb = dipole_array(**size)
+    return lambda: arr.excite_1by1(eb)
+
+
+@benchmark('ArrayModel.excite_1by1(factor_once)')
+def bench_excite_1by1_factor_once(size):
+    arr, eb = dipole_array(**size)
+    return lambda: arr.excite_1by1(eb, factor_once=True)
+
+
+@benchmark('EEP_SC.transform_to(OC)')
+def bench_transform_OC(size):
+    _, _, eep_sc = _eeps(size)
+    return lambda: eep_sc.transform_to('OC')
+
+
+@benchmark('EEP_SC.transform_to(OC, complex64)')
+def bench_transform_OC_c64(size):
+    _, _, eep_sc = _eeps(size)
+    eep_sc64 = eep_sc.astype(np.complex64)
+    return lambda: eep_sc64.transform_to('OC')
+
+
+@benchmark('EEP_SC.transform_to(NO)')
+def bench_transform_NO(size):
+    _, eb, eep_sc = _eeps(size)
+    adm_load = impedanceRLC(eb.freqsteps.aslist(), 50., None, None, 'series',
+                            False)
+    return lambda: eep_sc.transform_to('NO', adm_load=adm_load)
+
+
+@benchmark('EEPdata.get_EELs')
+def bench_get_EELs(size):
+    _, _, eep_sc = _eeps(size)
+    return eep_sc.get_EELs
+
+
+@benchmark('EELdata.area_eff')
+def bench_area_eff(size):
+    _, eb, eep_sc = _eeps(size)
+    adm_load = impedanceRLC(eb.freqsteps.aslist(), 50., None, None, 'series',
+                            False)
+    eel_no = eep_sc.transform_to('NO', adm_load=adm_load).get_EELs()
+    return eel_no.area_eff
+
+
+@benchmark('ArrayModel.calc_steering_vector')
+def bench_steering_vector(size):
+    arr, eb = dipole_array(**size)
+    return lambda: arr.calc_steering_vector(eb)
+
+
+@benchmark('ArrayModel.calc_steering_vector(complex64)')
+def bench_steering_vector_c64(size):
+    arr, eb = dipole_array(**size)
+    return lambda: arr.calc_steering_vector(eb, dtype=np.complex64)
+
+
+@benchmark('EEPdata.form_beams')
+def bench_form_beams(size):
+    arr, eb, eep_sc = _eeps(size)
+    thetas, phis = eb.radpat.as_thetaphimeshs()
+    weights = arr.steering_weights(eb.freqsteps.aslist(), thetas, phis)
+    return lambda: eep_sc.form_beams(weights)
+
+
+def time_func(func, repeat=5, min_time=0.2):
+    """\
+    Time `func`, in seconds, `repeat` times
+
+    Calls are looped within each repeat so that it lasts at least `min_time`
+    and the time per call is returned for each repeat.
+    """
+    t0 = time.perf_counter()
+    func()
+    t_call = time.perf_counter() - t0
+    number = max(1, int(min_time / max(t_call, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - t0) / number)
+    return times
+
+
+def run(sizename, names=None, repeat=5, overrides=None):
+    """\
+    Run benchmarks, all or those in `names`, for size `sizename`
+
+    The parameters in dict `overrides` replace those of the size preset.
+    """
+    size = dict(SIZES[sizename], **(overrides or {}))
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        func = setup(size)
+        times = time_func(func, repeat)
+        results[name] = {'min': min(times), 'median': float(np.median(times)),
+                         'times': times}
+        throughput = ''
+        if hasattr(func, 'items'):
+            results[name]['items_per_sec'] = func.items / min(times)
+            throughput = f" {results[name]['items_per_sec']:12.0f} /s"
+        print(f'{name:40s} {min(times)*1e3:12.3f} ms{throughput}', flush=True)
+    return {'meta': _meta(sizename, size), 'results': results}
+
+
+def _meta(sizename, size):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'size': sizename, 'size_parms': size,
+            'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'pynec': NECcache._pynec_version(), 'machine': platform.node()}
+
+
+def compare(old, new, threshold=0.2):
+    """\
+    Report time ratios of `new` to `old` benchmark runs
+
+    Returns the names of the benchmarks whose minimum time increased by more
+    than the fraction `threshold`.
+    """
+    if (old['meta']['size'] != new['meta']['size']
+            or old['meta'].get('size_parms') != new['meta']['size_parms']):
+        print('Warning: comparing different sizes', old['meta']['size'],
+              old['meta'].get('size_parms'), new['meta']['size'],
+              new['meta']['size_parms'])
+    print(f"\n{'Benchmark':40s} {old['meta']['commit'] or 'old':>10s} "
+          f"{new['meta']['commit'] or 'new':>10s}    ratio")
+    regressions = []
+    for name, res in new['results'].items():
+        if name not in old['results']:
+            continue
+        t_old = old['results'][name]['min']
+        t_new = res['min']
+        ratio = t_new / t_old
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = ' REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            flag = ' improved'
+        print(f'{name:40s} {t_old*1e3:8.2f}ms {t_new*1e3:8.2f}ms '
+              f'{ratio:8.3f}{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=SIZES, default='small')
+    for parm in SIZES['small']:
+        parser.add_argument('--'+parm.replace('_', '-'), type=int,
+                            help=f'Override {parm} of the size preset')
+    parser.add_argument('--bench', action='append',
+                        help='Only run this benchmark (can be repeated)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='JSON file to write results to')
+    parser.add_argument('--compare', help='JSON file of run to compare to')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slow-down counted as a regression')
+    args = parser.parse_args(argv)
+    overrides = {parm: getattr(args, parm) for parm in SIZES['small']
+                 if getattr(args, parm) is not None}
+    new = run(args.size, args.bench, args.repeat, overrides)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(new, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare(old, new, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) over '
+                  f'{args.threshold:.0%}:', ', '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,13 @@
 import sys
+import tempfile
+import tracemalloc
 from io import StringIO
 import numpy as np
 import matplotlib.pyplot as plt
 from nec2array import (ArrayModel, StructureModel, Deck, Wire, VoltageSource,
-                  FreqSteps, ExecutionBlock, RadPatternSpec, impedanceRLC)
+                  FreqSteps, ExecutionBlock, RadPatternSpec, impedanceRLC,
+                  NECcache, NECcontextCache, StructureCurrents, EEPdata,
+                  NECout, ParameterSweep, RunStats)
 
 np.set_printoptions(threshold=sys.maxsize)
 
@@ -456,6 +460,631 @@ def test_get_antspats():
     plt.show()
 
 
+def test_excite_1by1_factor_once():
+    """
+    Test that reusing the factored matrix gives the same EEPs and admittances
+    """
+    threedip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 3, 140., 5.)  # MHz
+    threedip.segmentalize(65, fs.max_freq())
+    ex_port = ('VS', VoltageSource(1.0))
+    arr_pos = [[0.,0.,0.], [1.,0.,0.], [1.7,0.3,0.]]
+    threedip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    eb = ExecutionBlock(fs, ex_port, rps)
+    eepdat = threedip.excite_1by1(eb)
+    eepdat_fo = threedip.excite_1by1(eb, factor_once=True)
+    same_adm = np.allclose(eepdat.admittances, eepdat_fo.admittances)
+    same_pat = np.allclose(eepdat.get_antspats_arr(),
+                           eepdat_fo.get_antspats_arr())
+    print('Factor once same admittances & EEPs. Should be True:',
+          same_adm and same_pat)
+    assert same_adm and same_pat
+
+
+def test_excite_1by1_workers():
+    """
+    Test that element excitations in a process pool match the serial run
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 140., 5.)  # MHz
+    twodip.segmentalize(65, fs.max_freq())
+    ex_port = ('VS', VoltageSource(1.0))
+    arr_pos = [[0.,0.,0.], [1.,0.,0.], [1.7,0.3,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    eb = ExecutionBlock(fs, ex_port, rps)
+    eepdat = twodip.excite_1by1(eb)
+    eepdat_par = twodip.excite_1by1(eb, workers=2)
+    same = (np.array_equal(eepdat.admittances, eepdat_par.admittances)
+            and np.array_equal(eepdat.get_antspats_arr(),
+                               eepdat_par.get_antspats_arr()))
+    print('Parallel excitations identical. Should be True:', same)
+    assert same
+
+
+def test_get_necout_freqchunks():
+    """
+    Test that a frequency sweep split over workers matches the single run
+    """
+    dip, freq = lamhalfdip_aboveX()
+    fs = FreqSteps('lin', 7, freq/1e6-15., 5.)  # MHz
+    ex_port = ('VS', VoltageSource(1.0))
+    rps = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    eb = ExecutionBlock(fs, [ex_port], rps)
+    necout, _ = dip.get_necout(eb)
+    necout_chnk, _ = dip.get_necout(eb, workers=2, nrfreqchunks=3)
+    same = (necout.freqs == necout_chnk.freqs
+            and np.allclose(necout.inp_Z, necout_chnk.inp_Z)
+            and np.allclose(necout.f_tht, necout_chnk.f_tht)
+            and np.allclose(necout.f_phi, necout_chnk.f_phi))
+    print('Frequency chunked same as whole sweep. Should be True:', same)
+    assert same
+
+
+def test_NECcache():
+    """
+    Test that cached NEC runs are returned without running NEC again
+    """
+    dip, freq = lamhalfdip_aboveX()
+    fs = FreqSteps('lin', 3, freq/1e6-5., 5.)  # MHz
+    rps = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    eb = ExecutionBlock(fs, [('VS', VoltageSource(1.0))], rps)
+    with tempfile.TemporaryDirectory() as cachedir:
+        cache = NECcache(cachedir)
+        necout, cntxt = dip.get_necout(eb, cache=cache)
+        necout_hit, cntxt_hit = dip.get_necout(eb, cache=cache)
+        print('Cache hit did not run NEC. Should be True:',
+              cntxt is not None and cntxt_hit is None)
+        assert cntxt is not None and cntxt_hit is None
+        assert np.array_equal(necout.f_tht, necout_hit.f_tht)
+        key = cache.key(dip.as_neccards())
+        cache.invalidate(key)
+        assert key not in cache
+        cache.invalidate()
+        assert cache.size() == 0
+
+
+def test_NECcontextCache():
+    """
+    Test that new radiation patterns from cached contexts match a new solve
+    """
+    dip, freq = lamhalfdip_aboveX()
+    fs = FreqSteps('lin', 2, freq/1e6, 5.)  # MHz
+    ex_ports = [('VS', VoltageSource(1.0))]
+    rps_coarse = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    rps_fine = RadPatternSpec(nth=5, thets=10., dth=5., nph=2, dph=30.)
+    ctx_cache = NECcontextCache(maxcount=4)
+    dip.get_necout(ExecutionBlock(fs, ex_ports, rps_coarse),
+                   context_cache=ctx_cache)
+    necout_fine, _ = dip.get_necout(ExecutionBlock(fs, ex_ports, rps_fine),
+                                    context_cache=ctx_cache)
+    necout_fine_solved, _ = dip.get_necout(
+        ExecutionBlock(fs, ex_ports, rps_fine))
+    same = (np.allclose(necout_fine.f_tht, necout_fine_solved.f_tht)
+            and np.allclose(necout_fine.f_phi, necout_fine_solved.f_phi)
+            and np.allclose(necout_fine.inp_Z, necout_fine_solved.inp_Z))
+    print('Pattern from cached context same as solved. Should be True:', same)
+    assert same and len(ctx_cache) == 2
+
+
+def test_StructureCurrents_get_currents():
+    """
+    Test that port currents gathered for many tags match one at a time
+    """
+    nr_ants, nr_segs = 256, 11
+    sc = StructureCurrents([100.], nr_ants)
+    sc.set_segtags(np.repeat(np.arange(10, 10+nr_ants), nr_segs))
+    sc.set_segnums(np.arange(1, nr_ants*nr_segs+1))
+    sc.set_currents(np.arange(nr_ants*nr_segs)*(1+1j))
+    tags = list(range(10, 10+nr_ants))
+    currs_1by1 = np.array([sc.get_current(tag, 6) for tag in tags])
+    same = np.array_equal(sc.get_currents(tags, 6), currs_1by1)
+    print('Gathered currents same as 1 by 1. Should be True:', same)
+    assert same
+    for bad_tags in ([10, 9], [10, 10+nr_ants]):
+        try:
+            sc.get_currents(bad_tags, 6)
+            raised = False
+        except ValueError as err:
+            raised = True
+            print('Unknown tag raised:', err)
+        assert raised
+
+
+def test_capture_currents():
+    """
+    Test capturing all structure currents in excite_1by1
+
+    The captured currents on the element ports should be the admittances.
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 3, 140., 5.)  # MHz
+    twodip.segmentalize(65, fs.max_freq())
+    ex_port = ('VS', VoltageSource(1.0))
+    arr_pos = [[0.,0.,0.], [1.,0.,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    eepdat = twodip.excite_1by1(ExecutionBlock(fs, ex_port),
+                                capture_currents=np.complex64)
+    sc = eepdat.structure_currents
+    print('Captured currents shape (excitation, freq, segment):',
+          sc.currents_arr.shape, sc.currents_arr.dtype)
+    port_tags = [twodip.elements_tags[antnr][0] for antnr in range(2)]
+    port_idxs = sc._current_indices(port_tags, twodip['dip']['Z'].port.ex_seg)
+    port_currs = np.moveaxis(sc.currents_arr[..., port_idxs], 0, -1)
+    same = np.allclose(port_currs, eepdat.admittances, rtol=1e-5)
+    print('Port currents are admittances. Should be True:', same)
+    assert same
+
+
+def test_EEPdata_tensor_views():
+    """
+    Test that EEPs are views into one pattern array with shared coordinates
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 140., 5.)  # MHz
+    twodip.segmentalize(65, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    eepdat = twodip.excite_1by1(ExecutionBlock(fs, ('VS', VoltageSource(1.0)),
+                                               rps))
+    antspats = eepdat.get_antspats_arr()
+    zero_copy = eepdat.get_antspats_arr() is antspats
+    views = all(np.shares_memory(eep.f_tht, antspats)
+                and np.shares_memory(eep.f_phi, antspats)
+                for eep in eepdat.eeps)
+    shared = all(eep.freqs is eepdat.eeps[0].freqs
+                 and eep.thetas is eepdat.eeps[0].thetas
+                 for eep in eepdat.eeps)
+    print('EEPs zero-copy views with shared coords. Should be True:',
+          zero_copy and views and shared)
+    assert zero_copy and views and shared
+    eepdat_OC = eepdat.transform_to('OC')
+    assert all(np.shares_memory(eep.f_tht, eepdat_OC.get_antspats_arr())
+               for eep in eepdat_OC.eeps)
+    new_f_tht = 2*eepdat.eeps[1].f_tht
+    eepdat.eeps[1].f_tht = new_f_tht
+    rebuilt = eepdat.get_antspats_arr()
+    ok = (rebuilt is not antspats
+          and np.array_equal(rebuilt[1, ..., 0], new_f_tht)
+          and np.shares_memory(eepdat.eeps[1].f_tht, rebuilt))
+    print('Pattern array rebuilt after reassigned f_tht. Should be True:', ok)
+    assert ok
+
+def test_loaded_transforms_roundtrip():
+    """
+    Test that transforms through loaded excitations return the original EEPs
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 140., 5.)  # MHz
+    twodip.segmentalize(65, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=10, dth=10., nph=8, dph=45.)
+    eep_SC = twodip.excite_1by1(ExecutionBlock(fs, ('VS', VoltageSource(1.0)),
+                                               rps))
+    ap_SC = eep_SC.get_antspats_arr()
+    load_adm = impedanceRLC(fs.aslist(), 50., None, None, 'series', False)
+    eep_NO_SC = eep_SC.transform_to('NO', adm_load=load_adm).transform_to('SC')
+    eep_OC = eep_SC.transform_to('OC')
+    eep_TH_OC = eep_OC.transform_to('TH', imp_load=50.).transform_to('OC')
+    same = (np.allclose(eep_NO_SC.get_antspats_arr(), ap_SC)
+            and np.allclose(eep_TH_OC.get_antspats_arr(),
+                            eep_OC.get_antspats_arr()))
+    print('SC->NO->SC and OC->TH->OC round trips. Should be True:', same)
+    assert same
+
+def test_EEPdata_save_load():
+    """
+    Test saving EEPdata and loading it memory-mapped
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 140., 5.)  # MHz
+    twodip.segmentalize(65, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    eep_SC = twodip.excite_1by1(ExecutionBlock(fs, ('VS', VoltageSource(1.0)),
+                                               rps))
+    load_adm = impedanceRLC(fs.aslist(), 50., None, None, 'series', False)
+    eel_NO = eep_SC.transform_to('NO', adm_load=load_adm).get_EELs()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        eep_SC.save(tmpdir+'/eep_SC')
+        eel_NO.save(tmpdir+'/eel_NO')
+        eep_SC_ld = EEPdata.load(tmpdir+'/eep_SC')
+        eel_NO_ld = EEPdata.load(tmpdir+'/eel_NO')
+        mmapped = isinstance(eep_SC_ld.get_antspats_arr(), np.memmap)
+        same = (np.array_equal(eep_SC_ld.get_antspats_arr(),
+                               eep_SC.get_antspats_arr())
+                and np.array_equal(eep_SC_ld.admittances, eep_SC.admittances)
+                and np.array_equal(eel_NO_ld.area_eff(), eel_NO.area_eff()))
+        freq_slice = np.array_equal(eep_SC_ld.eeps[1].f_tht[1],
+                                    eep_SC.eeps[1].f_tht[1])
+        print('Loaded memory-mapped EEPs same as saved. Should be True:',
+              mmapped and same and freq_slice)
+        assert mmapped and same and freq_slice
+        del eep_SC_ld, eel_NO_ld
+        # Without radiation pattern there are no thetas and phis to save
+        eep_SC_nopat = twodip.excite_1by1(
+            ExecutionBlock(fs, ('VS', VoltageSource(1.0)), None))
+        eep_SC_nopat.save(tmpdir+'/eep_SC_nopat')
+        eep_SC_nopat_ld = EEPdata.load(tmpdir+'/eep_SC_nopat')
+        ok = (eep_SC_nopat_ld.eeps[0].thetas is None
+              and np.array_equal(eep_SC_nopat_ld.admittances,
+                                 eep_SC_nopat.admittances))
+        print('Loaded EEPs without patterns same as saved. Should be True:', ok)
+        assert ok
+        del eep_SC_nopat_ld
+
+def test_iter_necout():
+    """
+    Test that streaming results per frequency gives the same as whole sweep
+    """
+    fs = FreqSteps('lin', 3, 10., 5.)  # MHz
+    abradip, port_name = sim_abraham_dip(fs.max_freq())
+    rps = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    eb = ExecutionBlock(fs, [(port_name, VoltageSource(1.0))], rps)
+    necout, _ = abradip.get_necout(eb)
+    necout_st = None
+    for frqnr, (necout_f, nec_context) in enumerate(abradip.iter_necout(eb)):
+        if necout_st is None:
+            necout_st = NECout.alloc_freqs(necout_f, fs.aslist())
+        necout_st.set_freq(frqnr, necout_f)
+    same = (np.array_equal(necout_st.f_tht, necout.f_tht)
+            and np.array_equal(necout_st.f_phi, necout.f_phi)
+            and np.array_equal(necout_st.inp_Z, necout.inp_Z))
+    print('Streamed frequencies same as sweep. Should be True:', same)
+    assert same
+
+def test_excite_1by1_stats_progress():
+    """
+    Test phase stats and progress events of excite_1by1
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 140., 5.)  # MHz
+    twodip.segmentalize(65, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=3, dth=10., nph=4, dph=45.)
+    eep_eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+    for factor_once in (False, True):
+        events = []
+        eepdat = twodip.excite_1by1(eep_eb, factor_once=factor_once,
+                                    progress=events.append)
+        print(eepdat.stats)
+        phases = {'deck', 'geometry', 'solve', 'patterns', 'currents',
+                  'postproc'}
+        ok = (set(eepdat.stats.phases) == phases
+              and events[-1].done == events[-1].total and events[-1].eta == 0.
+              and [_e.done for _e in events] == list(range(1, len(events)+1)))
+        print('Stats of all phases and progress events. Should be True:', ok)
+        assert ok
+    stats = RunStats(trace_alloc=True)
+    with stats.phase('small'):
+        _small = np.ones(2**10)
+    with stats.phase('big'):
+        _big = np.ones(2**22)
+        with stats.phase('small'):
+            _small = np.ones(2**10)
+    print(stats)
+    ok = all(_ph['rss_growth'] is None or _ph['rss_growth'] >= 0
+             for _ph in stats.phases.values())
+    if hasattr(tracemalloc, 'reset_peak'):
+        ok = ok and (stats.phases['big']['alloc_peak'] >= _big.nbytes
+                     and stats.phases['small']['alloc_peak'] < _big.nbytes)
+    tracemalloc.stop()
+    print('Memory of each phase attributed to it. Should be True:', ok)
+    assert ok
+
+def test_excite_1by1_symmetry():
+    """
+    Test that exciting one element per symmetry orbit gives the same EEPs
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 140., 5.)  # MHz
+    twodip.segmentalize(65, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.], [1.,1.,0.], [0.,1.,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=10, dth=10., nph=12, dph=30.)
+    eep_eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+    eepdat = twodip.excite_1by1(eep_eb)
+    eepdat_sym = twodip.excite_1by1(eep_eb, symmetry=True)
+    nr_sym = len(twodip.array_symmetries('VS', rps))
+    print('Nr of symmetries of square array of dipoles:', nr_sym)
+    same = (np.allclose(eepdat_sym.admittances, eepdat.admittances)
+            and np.allclose(eepdat_sym.get_antspats_arr(),
+                            eepdat.get_antspats_arr(), atol=1e-12))
+    print('Symmetry EEPs same as all excited. Should be True:', same)
+    assert same
+
+def test_reciprocity():
+    """
+    Test reciprocity residual and admittances filled by reciprocity
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 140., 5.)  # MHz
+    twodip.segmentalize(65, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.], [0.3,0.8,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    eep_eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), None)
+    eepdat = twodip.excite_1by1(eep_eb)
+    residual = eepdat.reciprocity_residual()
+    print('Reciprocity residual per frequency:', residual)
+    for factor_once in (False, True):
+        eepdat_rec = twodip.excite_1by1(eep_eb, factor_once=factor_once,
+                                        reciprocity=True)
+        adm_rec = eepdat_rec.admittances
+        ok = (np.all(eepdat_rec.reciprocity_residual() == 0.)
+              and np.allclose(adm_rec, eepdat.admittances,
+                              rtol=10*residual.max()))
+        print('Reciprocal admittances close to full. Should be True:', ok)
+        assert ok
+
+def test_excite_1by1_adaptive():
+    """
+    Test adaptive frequency sampling against solving every frequency
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 41, 100., 2.5)  # MHz
+    twodip.segmentalize(21, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=4, dth=30., nph=4, dph=90.)
+    eep_eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+    eepdat = twodip.excite_1by1(eep_eb)
+    eepdat_ad = twodip.excite_1by1_adaptive(eep_eb, tol=1e-4)
+    print('Nr of frequencies solved:', len(eepdat_ad.solved_freqs), 'of',
+          fs.nrsteps)
+    err_adm = (np.abs(eepdat_ad.admittances - eepdat.admittances).max()
+               / np.abs(eepdat.admittances).max())
+    err_eep = (np.abs(eepdat_ad.get_antspats_arr()
+                      - eepdat.get_antspats_arr()).max()
+               / np.abs(eepdat.get_antspats_arr()).max())
+    ok = (len(eepdat_ad.solved_freqs) < fs.nrsteps
+          and err_adm < 1e-3 and err_eep < 1e-3)
+    print('Adaptive sampling within tolerance. Should be True:', ok,
+          err_adm, err_eep)
+    assert ok
+
+
+def test_spherical_waves():
+    """
+    Test spherical-wave expansion of EEPs on and off the pattern grid
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 100., 20.)  # MHz
+    twodip.segmentalize(21, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=19, dth=10., nph=36, dph=10.)
+    eep_eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+    eepdat = twodip.excite_1by1(eep_eb)
+    swe = eepdat.to_spherical_waves(tol=1e-6, phase_centers=arr_pos)
+    antspats = eepdat.get_antspats_arr()
+    eep0 = eepdat.eeps[0]
+    thetas, phis = np.meshgrid(eep0.thetas, eep0.phis, indexing='ij')
+    err_grid = (np.abs(swe.eval(thetas, phis) - antspats).max()
+                / np.abs(antspats).max())
+    # Off-grid directions computed by NEC for reference
+    rps_off = RadPatternSpec(nth=3, thets=25., dth=40., nph=3, phis=15.,
+                             dph=100.)
+    eepdat_off = twodip.excite_1by1(ExecutionBlock(
+        fs, ('VS', VoltageSource(1.0)), rps_off))
+    eep0_off = eepdat_off.eeps[0]
+    thetas, phis = np.meshgrid(eep0_off.thetas, eep0_off.phis,
+                               indexing='ij')
+    antspats_off = eepdat_off.get_antspats_arr()
+    err_off = (np.abs(swe.eval(thetas, phis) - antspats_off).max()
+               / np.abs(antspats_off).max())
+    print('nmax', swe.nmax, 'compression ratio',
+          swe.compression_ratio(antspats[0, 0, ..., 0].size))
+    ok = err_grid < 1e-5 and err_off < 1e-4
+    print('Spherical-wave expansion matches EEPs. Should be True:', ok,
+          err_grid, err_off)
+    assert ok
+
+
+def test_form_beams():
+    """
+    Test batched beamforming against a direct sum over the EEPs
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 100., 20.)  # MHz
+    twodip.segmentalize(21, fs.max_freq())
+    arr_pos = [[0.,0.,0.], [1.,0.,0.], [2.,0.5,0.]]
+    twodip.arrayify(element=['dip'], array_positions=arr_pos)
+    rps = RadPatternSpec(nth=10, dth=10., nph=8, dph=45.)
+    eep_eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+    eepdat = twodip.excite_1by1(eep_eb)
+    weights = twodip.steering_weights(fs.aslist(), [0., 30., 60.],
+                                      [0., 45., 90.])
+    beams = eepdat.form_beams(weights, chunksize=7)
+    beams_ref = np.einsum('bfa,afthp->bfthp', weights,
+                          eepdat.get_antspats_arr())
+    sv = twodip.calc_steering_vector(eep_eb)
+    ok = (beams.shape == (3, 2, 10, 8, 2)
+          and np.allclose(beams, beams_ref)
+          and np.allclose(weights[1], sv[:, :, 3, 1].T.conj()/3))
+    print('Batched beams equal direct sum. Should be True:', ok)
+    assert ok
+
+
+def test_iter_steering_vectors():
+    """
+    Test chunked, single precision steering vectors against full ones
+    """
+    arr = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 3, 100., 20.)  # MHz
+    arr.arrayify(element=['dip'],
+                 array_positions=[[0.,0.,0.], [1.,0.,0.], [200.,30.,0.]])
+    rps = RadPatternSpec(nth=7, dth=15., nph=9, dph=40.)
+    eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+    sv = arr.calc_steering_vector(eb)
+    sv_dirs = np.concatenate([_sv for _, _sv in
+                              arr.iter_steering_vectors(eb, chunksize=10)],
+                             axis=-1)
+    sv_frqs = np.concatenate([_sv for _, _sv in
+                              arr.iter_steering_vectors(eb, chunksize=2,
+                                                        over='frequencies')],
+                             axis=1)
+    ok = (sv_dirs.dtype == np.complex64
+          and np.allclose(sv_dirs, sv.reshape(sv_dirs.shape), atol=1e-6)
+          and np.allclose(sv_frqs, sv, atol=1e-6)
+          and arr._cached_khat(rps) is arr._cached_khat(rps))
+    print('Chunked steering vectors equal full ones. Should be True:', ok)
+    assert ok
+
+
+def test_complex64_precision():
+    """
+    Test single precision patterns through transforms, EELs and beams
+    """
+    twodip = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 2, 100., 20.)  # MHz
+    twodip.segmentalize(21, fs.max_freq())
+    twodip.arrayify(element=['dip'], array_positions=[[0.,0.,0.], [1.,0.,0.]])
+    rps = RadPatternSpec(nth=10, dth=10., nph=8, dph=45.)
+    eep_eb = ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+    eep_sc = twodip.excite_1by1(eep_eb)
+    eep_sc64 = twodip.excite_1by1(eep_eb, dtype=np.complex64)
+    adm_load = impedanceRLC(fs.aslist(), 50., None, None, 'series', False)
+
+    def _relerr(eep64, eep):
+        ap64 = eep64.get_antspats_arr()
+        ap = eep.get_antspats_arr()
+        assert ap64.dtype == np.complex64
+        return np.abs(ap64 - ap).max() / np.abs(ap).max()
+
+    errs = {
+        'SC': _relerr(eep_sc64, eep_sc),
+        'astype': _relerr(eep_sc.astype(np.complex64), eep_sc),
+        'OC': _relerr(eep_sc64.transform_to('OC'), eep_sc.transform_to('OC')),
+        'NO': _relerr(eep_sc64.transform_to('NO', adm_load=adm_load),
+                      eep_sc.transform_to('NO', adm_load=adm_load)),
+        'EEL': _relerr(eep_sc64.get_EELs(), eep_sc.get_EELs()),
+    }
+    weights = twodip.steering_weights(fs.aslist(), [0., 30.], [0., 90.],
+                                      np.complex64)
+    beams64 = eep_sc64.form_beams(weights)
+    beams = eep_sc.form_beams(weights.astype(complex))
+    errs['beams'] = np.abs(beams64 - beams).max() / np.abs(beams).max()
+    print('Relative errors of single precision:', errs)
+    ok = (beams64.dtype == np.complex64
+          and eep_sc64.admittances.dtype == np.complex128
+          and max(errs.values()) < 1e-6)
+    print('Single precision within 1e-6. Should be True:', ok)
+    assert ok
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = NECcache(tmpdir)
+        dtypes = [twodip.excite_1by1(eep_eb, factor_once=factor_once,
+                                     cache=cache, dtype=np.complex64
+                                     ).get_antspats_arr().dtype
+                  for factor_once in (True, True, False, False)]
+    print('Single precision on cache miss & hit:', dtypes)
+    assert all(_dt == np.complex64 for _dt in dtypes)
+
+
+def test_Deck_gw_arrays():
+    """
+    Test GW cards of column and whitespace separated decks as arrays
+    """
+    necin = """\
+CM Two wires
+GW  1    7       0.0        0.      -.25        0.        0.       .25      .001
+GW  2    5        1.        0.      -.25        1.        0.       .25
+GE  0
+EN
+"""
+    d_col = Deck().load_necfile(StringIO(necin))
+    necin_csv = '\n'.join(_l[:2] + ' ' + ' '.join(_l[2:].split())
+                          for _l in necin.splitlines()[1:])
+    d_csv = Deck().load_necfile(StringIO(necin_csv), 'CSV')
+    tags, nsegs, ends, radii = d_col.gw_arrays()
+    ok = (d_col.carddeck[1:] == d_csv.carddeck
+          and tags.tolist() == [1, 2] and nsegs.tolist() == [7, 5]
+          and np.array_equal(ends[1], [[1., 0., -.25], [1., 0., .25]])
+          and radii.tolist() == [.001, 0.])
+    print('GW arrays of loaded decks. Should be True:', ok)
+    assert ok
+
+
+def test_Deck_write_to():
+    """
+    Test that streaming a deck to a file gives the same text as str()
+    """
+    d = test_Deck_load_necfile()
+    f = StringIO()
+    d.write_to(f)
+    ok = (f.getvalue() == str(d)
+          and Deck().load_necfile(StringIO(f.getvalue())) == d)
+    print('Streamed deck equals str(deck). Should be True:', ok)
+    assert ok
+
+
+def test_as_neccards_cached_geometry():
+    """
+    Test that cached geometry cards are reused and follow model changes
+    """
+    arr = lamhalfdip_alongZ()
+    fs = FreqSteps('lin', 1, 100.)  # MHz
+    arr.segmentalize(21, fs.max_freq())
+    arr.arrayify(element=['dip'], array_positions=[[0.,0.,0.], [1.,0.,0.]])
+    decks = []
+    for antnr in range(2):
+        arr.add_executionblock('eb', ExecutionBlock(
+            fs, [((antnr, 'VS'), VoltageSource(1.0))]), reset=True)
+        decks.append(arr.as_neccards())
+    geom_reused = arr._geometry_section(arr.element) is arr._geom_cache[1]
+    arr.arrayify(element=['dip'], array_positions=[[0.,0.,0.], [2.,0.,0.]])
+    arr['dip']['Z'].radius *= 2
+    deck_changed = arr.as_neccards()
+    _fresh = lamhalfdip_alongZ()
+    _fresh['dip']['Z'].radius *= 2
+    _fresh.segmentalize(21, fs.max_freq())
+    _fresh.arrayify(element=['dip'], array_positions=[[0.,0.,0.], [2.,0.,0.]])
+    _fresh.add_executionblock('eb', ExecutionBlock(
+        fs, [((1, 'VS'), VoltageSource(1.0))]))
+    ok = (geom_reused and decks[0].carddeck != decks[1].carddeck
+          and [_c for _c in decks[0] if _c[0] != 'EX']
+          == [_c for _c in decks[1] if _c[0] != 'EX']
+          and deck_changed == _fresh.as_neccards())
+    print('Geometry cache reused and invalidated. Should be True:', ok)
+    assert ok
+
+
+def test_parameter_sweep():
+    """
+    Test a parallel sweep over spacing and frequency with a duplicate point
+    """
+    def _factory(spacing, freq):
+        arr = lamhalfdip_alongZ()
+        fs = FreqSteps('lin', 1, freq)  # MHz
+        arr.segmentalize(21, fs.max_freq())
+        arr.arrayify(element=['dip'],
+                     array_positions=[[0.,0.,0.], [spacing,0.,0.]])
+        rps = RadPatternSpec(nth=3, dth=30., nph=2, dph=90.)
+        return arr, ExecutionBlock(fs, ('VS', VoltageSource(1.0)), rps)
+
+    sweep = ParameterSweep(_factory, {'spacing': [0.5, 1.0, 0.5],
+                                      'freq': [140., 150.]})
+    events = []
+    partial = []
+    for idx, params, result in sweep.iter_run(workers=2,
+                                              progress=events.append):
+        partial.append(sum(_r is not None for _r in sweep.results.flat))
+    adms = sweep.stack('admittances')
+    arr, eb = _factory(1.0, 150.)
+    adm_ref = arr.excite_1by1(eb).admittances
+    ok = (adms.shape == (3, 2, 1, 2, 2)
+          and events[-1].total == 4
+          and partial == sorted(partial) and partial[-1] == 6
+          and sweep.results[0, 1] is sweep.results[2, 1]
+          and np.allclose(adms[1, 1], adm_ref))
+    print('Sweep results stacked and deduplicated. Should be True:', ok)
+    assert ok
+
+
 test_Deck()
 test_Deck_load_necfile()
 test_Deck_exec_pynec()
@@ -469,3 +1098,26 @@ test_loaded_lamhalfdip()
 test_tuned_dipole_Array()
 test_dipole_area()
 test_get_antspats()
+test_excite_1by1_factor_once()
+test_excite_1by1_workers()
+test_get_necout_freqchunks()
+test_NECcache()
+test_NECcontextCache()
+test_StructureCurrents_get_currents()
+test_capture_currents()
+test_EEPdata_tensor_views()
+test_loaded_transforms_roundtrip()
+test_EEPdata_save_load()
+test_iter_necout()
+test_excite_1by1_stats_progress()
+test_excite_1by1_symmetry()
+test_reciprocity()
+test_excite_1by1_adaptive()
+test_spherical_waves()
+test_form_beams()
+test_iter_steering_vectors()
+test_complex64_precision()
+test_Deck_gw_arrays()
+test_Deck_write_to()
+test_as_neccards_cached_geometry()
+test_parameter_sweep()